@@ -1,15 +1,208 @@
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 import pandas as pd
 import re
 import os
+import csv
 import numpy 
 import numpy as np
 import shutil
+import tempfile
+import sys
+import html
+import subprocess
+import cProfile
+import threading
+import queue
+import signal
+from contextlib import contextmanager
+import json
+import hashlib
+import sqlite3
+import time
+import uuid
+import socket
+import glob
+import argparse
+import io
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial, lru_cache
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import tesserocr
+except ImportError:  # Optional: enables the persistent 'tesserocr' OCR backend
+    tesserocr = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: enables the partitioned Parquet output (--parquet)
+    pa = pq = None
+
+try:
+    import inotify_simple
+except ImportError:  # Optional: lets --watch react to new files without polling delay
+    inotify_simple = None
+
+# Path of the tesseract binary: the TESSERACT_CMD environment variable or
+# --tesseract-cmd override it; otherwise the usual install location is used
+WINDOWS_TESSERACT_CMD = r"C:\Tesseract-OCR\tesseract.exe"
+DEFAULT_TESSERACT_CMD = os.environ.get(
+    'TESSERACT_CMD', WINDOWS_TESSERACT_CMD if os.name == 'nt' else 'tesseract')
+
+# Header regions of a coversheet page as (left, top, right, bottom) boxes in
+# pixels at DEFAULT_DPI, scaled to the resolution of the page they are cut from;
+# a right edge of None runs to the edge of the page
+HEADER_REGIONS = {
+    "DEP": (1395, 130, None, 200),
+    "ARR": (1195, 130, 1400, 200),
+    "Flight Arrival": (250, 190, 400, 250),
+    "Flight Departure": (250, 250, 400, 300),
+    "From": (650, 190, 800, 250),
+    "To": (650, 250, 800, 300),
+    "AC Type:": (650, 150, 800, 190),
+}
 
-# Update this to your Tesseract installation path
-pytesseract.pytesseract.tesseract_cmd = r"C:\Tesseract-OCR\tesseract.exe"
+# Reference resolution of the boxes above, and default rendering resolution of the PDF pages
+DEFAULT_DPI = 200
+
+# Full-width strip of the page holding every header region, in the same units
+HEADER_BAND = (0, min(box[1] for box in HEADER_REGIONS.values()), None,
+               max(box[3] for box in HEADER_REGIONS.values()))
+
+# Suffix of the header band image rendered next to a page rasterized below the header resolution
+HEADER_SUFFIX = '.header.png'
+
+# Number of PDF pages rasterized (and held in memory) at a time
+DEFAULT_RASTER_CHUNK = 4
+
+# Time-chart labels as (label in the page text, start fields, finish field, mode).
+# Mode 'optional' keeps the first occurrence of the label even without a time,
+# 'rest_of_line' takes the last time after the start instead of the next one.
+TIME_CHART_LABELS = [
+    ("STA:", ["STA"], None, None),
+    ("ETA:", ["ETA"], None, None),
+    ("ATA:", ["ATA"], None, None),
+    ("STD:", ["STD"], None, None),
+    ("ETD:", ["ETD"], None, 'optional'),
+    ("ATD:", ["ATD"], None, 'optional'),
+    ("Blocks In", ["Blocks In"], None, None),
+    ("Position PLB/Step", ["Position PLB/Step"], None, None),
+    ("Open Door", ["Open Door"], None, None),
+    ("Passenger Deplane", ["Passenger Deplane Start"], "Passenger Deplane Finish", None),
+    ("Cabin Cleaning", ["Cabin Cleaning Start", "Cabin Cleaning start"], "Cabin Cleaning Finish", None),
+    ("Customs Clearance", ["Customs Clearance Start"], "Customs Clearance Finish", None),
+    ("Galley Services", ["Galley Services Start"], "Galley Services Finish", 'rest_of_line'),
+    ("Cabin Security Check", ["Cabin Security Check Start"], "Cabin Security Check Finish", None),
+    ("Boarding Clearance", ["Boarding Clearance"], None, None),
+    ("Passengers Enplane", ["Passengers Enplane Start"], "Passengers Enplane Finish", None),
+    ("TOP Finalization", ["TOP Finalization Start"], "TOP Finalization Finish", None),
+    ("FWD Unloading", ["FWD Unloading Start"], "FWD Unloading Finish", None),
+    ("FWD Loading", ["FWD Leading Start"], "FWD Leading Finish", None),
+    ("AFT Unloading", ["AFT Unloading Start"], "AFT Unloading Finish", None),
+    ("AFT Loading", ["AFT Loading Start"], "AFT Loading Finish", None),
+    ("Bulk Unloading", ["Bulk Unloading Start"], "Bulk Unloading Finish", None),
+    ("Bulk Loading", ["Bulk Loading Start"], "Bulk Loading Finish", None),
+    ("GPU/ACU Support", ["GPU/ACU Support Start"], "GPU/ACU Support Finish", None),
+    ("Refueling", ["Refueling Start"], "Refueling Finish", None),
+    ("Remove PLB/Step", ["Remove PLB/Step"], None, None),
+    ("Close Door", ["Close Door"], None, None),
+    ("Pushback/Block-out", ["Pushback/Block-out"], None, None),
+]
+TIME_CHART_SPECS = {spec[0]: spec for spec in TIME_CHART_LABELS}
+
+# Compiled once at import: one alternation of every label, followed by up to two times
+TIME_CHART_SCANNER = re.compile(
+    r"(?P<label>" + "|".join(re.escape(label) for label, *_ in TIME_CHART_LABELS) + r")"
+    r"\s*(?:(?P<first>\d{2}:\d{2})(?:\s*(?P<second>\d{2}:\d{2}))?)?"
+)
+DATE_PATTERN = re.compile(r"Date:\s*(\d{2}\.\d{2}\.\d{4})")
+LAST_TIME_PATTERN = re.compile(r".*\s*(\d{2}:\d{2})")
+
+# Elements of `pdftotext -bbox-layout` output and their numeric attributes
+PDFTOTEXT_TAG = re.compile(r"<(page|block|line|word)\b([^>]*)>(?:([^<]*)</word>)?")
+PDFTOTEXT_ATTRIBUTE = re.compile(r'(\w+)="([-\d.]+)"')
+
+# Default size limit of the persistent OCR cache
+DEFAULT_OCR_CACHE_MB = 512
+
+# Record of rasterized PDFs and committed pages used by --resume
+DEFAULT_MANIFEST = 'manifest.jsonl'
+
+# Suffix of the word-box files saved for PDF pages that carry a text layer
+WORDS_SUFFIX = '.words.json'
+
+# Minimum number of embedded words for a PDF page to skip rasterization and OCR
+MIN_TEXT_LAYER_WORDS = 10
+
+# Columns identifying one turnaround; rows sharing them are merged into one record
+NATURAL_KEY = ['Date', 'Flight Arrival', 'Flight Departure', 'Station']
+
+# Run-report counter of each RecordStore.upsert outcome
+UPSERT_COUNTERS = {'new': 'appended_rows', 'duplicate': 'duplicate_rows', 'merged': 'merged_rows'}
+
+# Parquet output: columns stored as dictionary-encoded categoricals, and the
+# column the dataset is partitioned on (with the row date) instead of storing it
+CATEGORICAL_COLUMNS = ['Flight Arrival', 'Flight Departure', 'From', 'To', 'AC Type:']
+PARTITION_COLUMN = 'Station'
+
+# Pipeline mode: pages waiting between two stages
+DEFAULT_PIPELINE_QUEUE = 16
+
+# Watch mode: PDFs queued ahead of the pipeline, seconds between folder scans,
+# and seconds a new file must stay unchanged before it is picked up
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_SETTLE_SECONDS = 1.0
+
+# Page triage: thumbnail sampling factor, grey level below which a pixel counts
+# as ink, and the default minimum ink fraction of a coversheet (see triage_page)
+TRIAGE_REDUCE = 8
+INK_LEVEL = 128
+DEFAULT_TRIAGE_THRESHOLD = 0.002
+
+# Station written into every row (--station)
+DEFAULT_STATION = 'RUH'
+
+# Sharded mode: seconds without a heartbeat after which a worker's lease on a
+# PDF may be taken over, and seconds an idle worker waits before looking again
+DEFAULT_LEASE_TIMEOUT = 300
+DEFAULT_SHARD_POLL = 5.0
+
+# Master result file the extracted rows are appended to
+OUTPUT_CSV = 'CRS - RUH copy.csv'
+
+# Number of rows the result sink buffers before appending them to the CSV
+DEFAULT_FLUSH_SIZE = 25
+
+# Time-chart columns that are cleaned with clean_time_format
+TIME_COLUMNS = ['STA', 'ETA', 'ATA', 'STD', 'ETD', 'ATD','Blocks In',
+    'Position PLB/Step', 'Open Door', 'Passenger Deplane Start',
+    'Passenger Deplane Finish', 'Customs Clearance Start',
+    'Customs Clearance Finish', 'Cabin Cleaning start',
+    'Cabin Cleaning Finish', 'Galley Services Start',
+    'Galley Services Finish', 'Cabin Security Check Start',
+    'Cabin Security Check Finish', 'Boarding Clearance',
+    'Passengers Enplane Start', 'Passengers Enplane Finish',
+    'TOP Finalization Start', 'TOP Finalization Finish',
+    'FWD Unloading Start', 'FWD Unloading Finish', 'FWD Leading Start',
+    'FWD Leading Finish', 'AFT Unloading Start', 'AFT Unloading Finish',
+    'AFT Loading Start', 'AFT Loading Finish', 'Bulk Unloading Start',
+    'Bulk Unloading Finish', 'Bulk Loading Start', 'Bulk Loading Finish',
+    'GPU/ACU Support Start', 'GPU/ACU Support Finish', 'Refueling Start',
+    'Refueling Finish', 'Close Door', 'Remove PLB/Step',
+    'Pushback/Block-out']
+
+# Column layout used when the output CSV does not exist yet
+CSV_COLUMNS = ['Date', 'Station', 'Flight Arrival', 'Flight Departure', 'AC Type:',
+    'From', 'To', 'ARR PRN', 'ARR NAME', 'DEP PRN', 'DEP NAME'] + TIME_COLUMNS
 
 
 def convert_to_csv_safe(img_folder, output_folder='CSV', retries=3):
@@ -35,30 +228,572 @@ def convert_to_csv_safe(img_folder, output_folder='CSV', retries=3):
 
                    
 
-def save_images(pdf_folder, output_folder='IMG'):
-    # Ensure the main output 'img' folder exists
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
+class Metrics:
+    """
+    Per-run stage timers and counters of the pipeline.
+
+    Stage timings keep count, total and max plus the first SAMPLE_LIMIT durations
+    for percentiles. Pool workers hand their metrics back with every page
+    (see drain) and the parent merges them. Safe to use from several threads.
+    """
+
+    SAMPLE_LIMIT = 100000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget every timer and counter.
+        """
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+            self.page_paths = {}
+            self.started = time.time()
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the enclosed block as one occurrence of a stage.
+        :param stage: Stage name, e.g. 'ocr' or 'csv_flush'.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        """
+        Record one duration of a stage.
+        """
+        with self._lock:
+            timing = self.timings.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'samples': []})
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+            if len(timing['samples']) < self.SAMPLE_LIMIT:
+                timing['samples'].append(seconds)
+
+    def incr(self, name, amount=1):
+        """
+        Increase a counter.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_page(self, page, route):
+        """
+        Remember which path a page took through the pipeline and count it.
+        :param page: Page file.
+        :param route: e.g. 'ocr' or 'text_layer'.
+        """
+        with self._lock:
+            self.page_paths[page] = route
+            name = f"pages_{route}"
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def drain(self):
+        """
+        Return the metrics gathered so far and start over; used by pool workers.
+        :return: Dictionary with 'counters' and 'timings'.
+        """
+        with self._lock:
+            snapshot = {'counters': self.counters, 'timings': self.timings, 'page_paths': self.page_paths}
+            self.counters = {}
+            self.timings = {}
+            self.page_paths = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        Add metrics drained from another process.
+        :param snapshot: Output of drain.
+        """
+        with self._lock:
+            for name, amount in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            for stage, other in snapshot['timings'].items():
+                timing = self.timings.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'samples': []})
+                timing['count'] += other['count']
+                timing['total'] += other['total']
+                timing['max'] = max(timing['max'], other['max'])
+                room = self.SAMPLE_LIMIT - len(timing['samples'])
+                timing['samples'].extend(other['samples'][:max(room, 0)])
+            self.page_paths.update(snapshot.get('page_paths', {}))
+
+    def report(self):
+        """
+        :return: JSON-serialisable run report with counters and per-stage timings (ms).
+        """
+        with self._lock:
+            stages = {}
+            for stage, timing in sorted(self.timings.items()):
+                samples = np.array(timing['samples']) * 1000
+                stages[stage] = {
+                    'count': timing['count'],
+                    'total_s': round(timing['total'], 4),
+                    'mean_ms': round(timing['total'] * 1000 / timing['count'], 3),
+                    'p50_ms': round(float(np.percentile(samples, 50)), 3),
+                    'p95_ms': round(float(np.percentile(samples, 95)), 3),
+                    'max_ms': round(timing['max'] * 1000, 3),
+                }
+            peak_rss = _peak_rss_mb()
+            return {
+                'wall_s': round(time.time() - self.started, 3),
+                'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+                'counters': dict(sorted(self.counters.items())),
+                'stages': stages,
+                'pages': dict(self.page_paths),
+            }
+
+    def report_prometheus(self):
+        """
+        :return: The run report in the Prometheus text exposition format.
+        """
+        report = self.report()
+        lines = []
+        for name, value in report['counters'].items():
+            lines.append(f"# TYPE coversheet_{name}_total counter")
+            lines.append(f"coversheet_{name}_total {value}")
+        lines.append("# TYPE coversheet_stage_seconds summary")
+        for stage, timing in report['stages'].items():
+            lines.append(f'coversheet_stage_seconds{{stage="{stage}",quantile="0.5"}} {timing["p50_ms"] / 1000}')
+            lines.append(f'coversheet_stage_seconds{{stage="{stage}",quantile="0.95"}} {timing["p95_ms"] / 1000}')
+            lines.append(f'coversheet_stage_seconds_sum{{stage="{stage}"}} {timing["total_s"]}')
+            lines.append(f'coversheet_stage_seconds_count{{stage="{stage}"}} {timing["count"]}')
+        lines.append("# TYPE coversheet_wall_seconds gauge")
+        lines.append(f"coversheet_wall_seconds {report['wall_s']}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        """
+        Save the run report: Prometheus text for a .prom file, JSON otherwise.
+        :param path: Output file.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.report_prometheus())
+            else:
+                json.dump(self.report(), f, indent=2)
+
+
+# Metrics of the current run
+METRICS = Metrics()
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a file's content, read in 1 MB blocks.
+    :param path: File path.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_page_file(file_name):
+    """
+    :return: True for the files of a PDF folder that are pages (PNG images and
+        text-layer word files), False for header bands and anything else.
+    """
+    return file_name.endswith(('.png', WORDS_SUFFIX)) and not file_name.endswith(HEADER_SUFFIX)
+
+
+class Manifest:
+    """
+    Append-only record of finished work, used to resume a crashed batch.
+
+    Each line of the file is a JSON record: a rasterized PDF
+    ({"kind": "pdf", "name", "sha256", "pages"}) or a page whose rows reached the
+    CSV ({"kind": "page", "path", "sha256"}). Records are fsynced as they are
+    written, and a torn last line left by a crash is ignored on load.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        """
+        :param path: Manifest file; created on the first record.
+        """
+        self.path = path
+        self.pdfs = {}
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('kind') == 'pdf':
+                        self.pdfs[record['name']] = record
+                    elif record.get('kind') == 'page':
+                        self.pages[record['path']] = record['sha256']
+
+    def _append(self, records):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pdf_done(self, name, sha256, output_folder):
+        """
+        :param name: PDF file name.
+        :param sha256: Content hash of the PDF.
+        :param output_folder: Folder its pages were saved to.
+        :return: True if this exact PDF was fully rasterized and its pages are still there.
+        """
+        record = self.pdfs.get(name)
+        if record is None or record['sha256'] != sha256 or not os.path.isdir(output_folder):
+            return False
+        saved = [f for f in os.listdir(output_folder) if is_page_file(f)]
+        return len(saved) >= record['pages']
+
+    def mark_pdf(self, name, sha256, pages):
+        """
+        Record a fully rasterized PDF.
+        """
+        record = {'kind': 'pdf', 'name': name, 'sha256': sha256, 'pages': pages}
+        self._append([record])
+        self.pdfs[name] = record
+
+    def page_done(self, path, sha256):
+        """
+        :return: True if the page with this content already has its rows in the CSV.
+        """
+        return self.pages.get(self._page_key(path)) == sha256
+
+    def mark_pages(self, pages):
+        """
+        Record pages whose rows were written.
+        :param pages: Iterable of (page path, content hash).
+        """
+        records = [{'kind': 'page', 'path': self._page_key(path), 'sha256': sha256} for path, sha256 in pages]
+        if records:
+            self._append(records)
+            for record in records:
+                self.pages[record['path']] = record['sha256']
+
+    @staticmethod
+    def _page_key(path):
+        # Pages are identified by '<pdf name>/<page file>' so the IMG root can move
+        return "/".join(os.path.normpath(path).split(os.sep)[-2:])
+
+
+def _peak_rss_mb():
+    """
+    Peak resident memory of this process so far, in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _current_rss_mb():
+    """
+    Resident memory of this process right now, in MB (None where /proc is not available).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _sample_rss(stats):
+    """
+    Record the current resident memory in stats['peak_rss_mb'] if it is the highest seen.
+    """
+    rss = _current_rss_mb()
+    if stats is not None and rss is not None:
+        stats['peak_rss_mb'] = max(stats.get('peak_rss_mb', 0), rss)
+
+
+def extract_pdf_text_layer(pdf_path):
+    """
+    Read the embedded text layer of every page of a PDF with poppler's pdftotext.
+    Word boxes are converted from PDF points to pixels at DEFAULT_DPI, the
+    resolution HEADER_REGIONS is defined in, so the same boxes select the header fields.
+    :param pdf_path: Path to the PDF file.
+    :return: Dictionary of page number (from 1) to {'width', 'height', 'words'}, where
+        words have the layout of extract_words_from_image; empty if pdftotext fails.
+    """
+    try:
+        output = subprocess.run(['pdftotext', '-bbox-layout', pdf_path, '-'],
+                                capture_output=True, check=True).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Warning: no text layer read from {pdf_path}: {e}")
+        return {}
+
+    scale = DEFAULT_DPI / 72
+    pages = {}
+    page = None
+    block = line = 0
+    for match in PDFTOTEXT_TAG.finditer(output):
+        tag, attributes, text = match.groups()
+        values = dict((name, float(value)) for name, value in PDFTOTEXT_ATTRIBUTE.findall(attributes))
+        if tag == 'page':
+            page = {'width': round(values.get('width', 0) * scale), 'height': round(values.get('height', 0) * scale), 'words': []}
+            pages[len(pages) + 1] = page
+            block = line = 0
+        elif tag == 'block':
+            block += 1
+        elif tag == 'line':
+            line += 1
+        elif tag == 'word' and page is not None and text and text.strip():
+            left, top = values['xMin'] * scale, values['yMin'] * scale
+            page['words'].append({
+                'text': html.unescape(text.strip()),
+                'left': round(left),
+                'top': round(top),
+                'width': round(values['xMax'] * scale - left),
+                'height': round(values['yMax'] * scale - top),
+                'line': (block, 0, line),
+            })
+    return pages
+
+
+def _page_runs(page_numbers, chunk_size):
+    """
+    Group sorted page numbers into runs of consecutive pages of at most chunk_size.
+    :return: List of (first page, last page).
+    """
+    runs = []
+    for number in page_numbers:
+        if runs and number == runs[-1][1] + 1 and number - runs[-1][0] < chunk_size:
+            runs[-1][1] = number
+        else:
+            runs.append([number, number])
+    return [tuple(run) for run in runs]
+
+
+def iter_pdf_pages(pdf_path, dpi=DEFAULT_DPI, grayscale=False, thread_count=1, chunk_size=DEFAULT_RASTER_CHUNK, stats=None, pages=None):
+    """
+    Rasterize a PDF a few pages at a time, yielding each page as soon as its chunk is ready.
+    At most chunk_size decoded pages are held in memory at once.
+    :param pdf_path: Path to the PDF file.
+    :param dpi: Rendering resolution.
+    :param grayscale: Render single-channel pages instead of RGB.
+    :param thread_count: Number of poppler threads used per chunk.
+    :param chunk_size: Number of pages rendered per poppler call.
+    :param stats: Optional dictionary updated with 'pages', 'peak_chunk_mb' and,
+        sampled while each chunk is held, 'peak_rss_mb'.
+    :param pages: Page numbers to render (all pages if None).
+    :return: Generator of (page number, PIL image), page numbers starting at 1.
+    """
+    if pages is None:
+        pages = range(1, pdfinfo_from_path(pdf_path)['Pages'] + 1)
+    chunk_size = max(1, int(chunk_size))
+    for first_page, last_page in _page_runs(sorted(pages), chunk_size):
+        with METRICS.timer('rasterize'):
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                       grayscale=grayscale, thread_count=thread_count)
+        METRICS.incr('pages_rasterized', len(images))
+        if stats is not None:
+            chunk_mb = sum(img.width * img.height * len(img.getbands()) for img in images) / (1024 * 1024)
+            stats['peak_chunk_mb'] = max(stats.get('peak_chunk_mb', 0), chunk_mb)
+            stats['pages'] = stats.get('pages', 0) + len(images)
+            _sample_rss(stats)
+        for offset, image in enumerate(images):
+            yield first_page + offset, image
+        # Drop the chunk before the next one is rendered
+        del images
+
+
+def image_dpi(img):
+    """
+    :param img: PIL image of a page or page band.
+    :return: Resolution the image was rendered at according to its metadata, DEFAULT_DPI if unknown.
+    """
+    dpi = img.info.get('dpi')
+    return round(dpi[0]) if dpi else DEFAULT_DPI
+
+
+def scale_box(box, dpi, width, origin=(0, 0)):
+    """
+    Convert a (left, top, right, bottom) box in pixels at DEFAULT_DPI to pixels at dpi.
+    :param box: Box as in HEADER_REGIONS.
+    :param dpi: Resolution of the target image.
+    :param width: Width of the target image, used for a right edge of None.
+    :param origin: Top-left corner of the target image on the page (at DEFAULT_DPI),
+        for images of a page band rather than the full page.
+    :return: Box in pixels of the target image.
+    """
+    scale = dpi / DEFAULT_DPI
+    left, top, right, bottom = box
+    x, y = origin
+    right = width if right is None else round((right - x) * scale)
+    return round((left - x) * scale), round((top - y) * scale), right, round((bottom - y) * scale)
+
+
+def preprocess_image(img, grayscale=False, threshold=None, scale=1.0):
+    """
+    Shrink an image before it reaches the OCR engine.
+    :param img: PIL image.
+    :param grayscale: Convert to a single 8-bit channel.
+    :param threshold: Binarize to black and white at this grey level (0-255); None keeps grey levels.
+    :param scale: Downscale factor (1 keeps the resolution); the recorded DPI follows it.
+    :return: Preprocessed PIL image.
+    """
+    with METRICS.timer('preprocess'):
+        if (grayscale or threshold is not None) and img.mode != 'L':
+            img = img.convert('L')
+        if threshold is not None:
+            img = img.point(lambda value: 255 if value > threshold else 0, mode='1')
+        if scale != 1:
+            dpi = image_dpi(img) * scale
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                             Image.BILINEAR if img.mode == '1' else Image.LANCZOS)
+            img.info['dpi'] = (dpi, dpi)
+    return img
+
+
+def render_region(pdf_path, page_number, box, dpi, grayscale=False):
+    """
+    Render a single region of a PDF page with pdftoppm, without rasterizing the rest of the page.
+    :param pdf_path: Path to the PDF file.
+    :param page_number: Page number, from 1.
+    :param box: Region in pixels at DEFAULT_DPI, as in HEADER_REGIONS.
+    :param dpi: Rendering resolution.
+    :param grayscale: Render a single-channel image instead of RGB.
+    :return: PIL image of the region, with its DPI recorded.
+    """
+    left, top, right, bottom = scale_box(box, dpi, 0)
+    command = ['pdftoppm', '-f', str(page_number), '-l', str(page_number), '-r', str(dpi),
+               '-x', str(left), '-y', str(top), '-W', str(right - left if right else 0), '-H', str(bottom - top),
+               '-png']
+    if grayscale:
+        command.append('-gray')
+    output = subprocess.run(command + [pdf_path], capture_output=True, check=True).stdout
+    img = Image.open(io.BytesIO(output))
+    img.load()
+    img.info['dpi'] = (dpi, dpi)
+    return img
+
+
+def save_images(pdf_folder, output_folder='IMG', dpi=DEFAULT_DPI, grayscale=False, thread_count=1, chunk_size=DEFAULT_RASTER_CHUNK, manifest=None,
+                text_layer=True, threshold=None, header_dpi=None):
+    """
+    Rasterize every PDF in a folder to one PNG per page (see rasterize_pdf).
+    :param pdf_folder: Folder holding the PDF files.
+    :param output_folder: Folder that receives one sub-folder of pages per PDF.
+    The other parameters are passed on to rasterize_pdf.
+    :return: Dictionary of PDF file name to its report (pages, text_layer_pages, seconds,
+        peak_chunk_mb, peak_rss_mb).
+    """
+    reports = {}
     # Loop through all files in the PDF folder
     for filename in os.listdir(pdf_folder):
         if filename.endswith('.pdf'):
-            pdf_path = os.path.join(pdf_folder, filename)
-            
-            # Create a subfolder for each PDF inside the 'img' folder
-            pdf_name = os.path.splitext(filename)[0]
-            pdf_output_folder = os.path.join(output_folder, pdf_name)
-            
-            if not os.path.exists(pdf_output_folder):
-                os.makedirs(pdf_output_folder)
-            
-            # Convert PDF to images
-            images = convert_from_path(pdf_path)
-            
-            # Save each page as an image in the PDF-named folder
-            for i, image in enumerate(images):
-                image_name = f"page_{i+1}.png"
-                image.save(os.path.join(pdf_output_folder, image_name), 'PNG')
+            stats = rasterize_pdf(os.path.join(pdf_folder, filename), output_folder, dpi, grayscale, thread_count, chunk_size,
+                                  manifest, text_layer, threshold, header_dpi)
+            if stats is not None:
+                reports[filename] = stats
+    return reports
+
+
+def rasterize_pdf(pdf_path, output_folder='IMG', dpi=DEFAULT_DPI, grayscale=False, thread_count=1, chunk_size=DEFAULT_RASTER_CHUNK, manifest=None,
+                  text_layer=True, threshold=None, header_dpi=None, on_page=None):
+    """
+    Rasterize one PDF to one PNG per page, streaming pages in bounded chunks.
+    Header boxes scale with the DPI recorded in each PNG, so pages can be rendered
+    at a lower resolution than DEFAULT_DPI to cut the pixels the OCR engine reads.
+    :param pdf_path: Path to the PDF file.
+    :param output_folder: Folder that receives one sub-folder of pages per PDF.
+    :param dpi: Rendering resolution.
+    :param grayscale: Render single-channel pages instead of RGB.
+    :param thread_count: Number of poppler threads.
+    :param chunk_size: Number of pages held in memory at once.
+    :param manifest: Optional Manifest; a PDF it lists as rasterized (same content) is skipped.
+    :param text_layer: Save the embedded words of pages that have a text layer as
+        page_N.words.json instead of rasterizing them; only scanned pages become PNGs.
+    :param threshold: Binarize the saved images at this grey level (see preprocess_image).
+    :param header_dpi: When above dpi, also render HEADER_BAND of each page at this
+        resolution to page_N.header.png; the header fields are then read from it.
+    :param on_page: Optional callback receiving the path of every page file as soon as it is saved.
+    :return: Report of the PDF (pages, text_layer_pages, seconds, peak_chunk_mb, and
+        peak_rss_mb, the highest resident memory sampled while it was rasterized),
+        or None if the manifest lists it as done.
+    """
+    filename = os.path.basename(pdf_path)
+
+    # Create a subfolder for each PDF inside the 'img' folder
+    pdf_name = os.path.splitext(filename)[0]
+    pdf_output_folder = os.path.join(output_folder, pdf_name)
+
+    pdf_sha256 = file_sha256(pdf_path) if manifest is not None else None
+    if manifest is not None and manifest.pdf_done(filename, pdf_sha256, pdf_output_folder):
+        print(f"Skipping {filename}: already rasterized")
+        return None
+
+    if not os.path.exists(pdf_output_folder):
+        os.makedirs(pdf_output_folder)
+
+    stats = {'pages': 0, 'text_layer_pages': 0, 'peak_chunk_mb': 0}
+    started = time.perf_counter()
+
+    # Digital pages: keep the embedded words, no rasterization or OCR needed
+    scanned_pages = None
+    if text_layer:
+        with METRICS.timer('text_layer'):
+            text_pages = extract_pdf_text_layer(pdf_path)
+        if text_pages:
+            scanned_pages = []
+            for page_number, page in text_pages.items():
+                if len(page['words']) < MIN_TEXT_LAYER_WORDS:
+                    scanned_pages.append(page_number)
+                    continue
+                words_path = os.path.join(pdf_output_folder, f"page_{page_number}{WORDS_SUFFIX}")
+                with open(words_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(page, f)
+                os.replace(words_path + '.tmp', words_path)
+                stats['text_layer_pages'] += 1
+                if on_page is not None:
+                    on_page(words_path)
+
+    # Convert the scanned pages chunk by chunk and save each page as soon as it is rendered
+    for page_number, image in iter_pdf_pages(pdf_path, dpi, grayscale, thread_count, chunk_size, stats, scanned_pages):
+        image_path = os.path.join(pdf_output_folder, f"page_{page_number}.png")
+        # Write under a temporary name so a crash never leaves a truncated page
+        image = preprocess_image(image, grayscale, threshold)
+        _sample_rss(stats)
+        with METRICS.timer('save_png'):
+            image.save(image_path + '.tmp', 'PNG', dpi=(dpi, dpi))
+            os.replace(image_path + '.tmp', image_path)
+
+        # Small header text keeps its full resolution in a band of its own
+        if header_dpi and header_dpi > dpi:
+            with METRICS.timer('render_header'):
+                header = render_region(pdf_path, page_number, HEADER_BAND, header_dpi, grayscale)
+            header = preprocess_image(header, grayscale, threshold)
+            header_path = os.path.join(pdf_output_folder, f"page_{page_number}{HEADER_SUFFIX}")
+            header.save(header_path + '.tmp', 'PNG', dpi=(header_dpi, header_dpi))
+            os.replace(header_path + '.tmp', header_path)
+
+        if on_page is not None:
+            on_page(image_path)
+
+    if manifest is not None:
+        manifest.mark_pdf(filename, pdf_sha256, stats['pages'] + stats['text_layer_pages'])
+    METRICS.incr('pdfs_rasterized')
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['peak_chunk_mb'] = round(stats['peak_chunk_mb'], 1)
+    _sample_rss(stats)
+    # Peak while this PDF was rasterized; the process lifetime peak where RSS cannot be sampled
+    peak_rss = stats.get('peak_rss_mb', _peak_rss_mb())
+    stats['peak_rss_mb'] = round(peak_rss, 1) if peak_rss is not None else None
+    print(f"Rasterized {filename}: {stats['pages']} page(s), {stats['text_layer_pages']} text-layer page(s) in {stats['seconds']}s, "
+          f"peak chunk {stats['peak_chunk_mb']} MB, peak RSS {stats['peak_rss_mb']} MB")
+    return stats
 
    
 def clean_flight_code(flight_code):
@@ -113,6 +848,121 @@ def extract_8_digits(prn_value):
     match = re.match(r'^(\d{8})', prn_value.strip())
     return match.group(1) if match else np.nan
 
+def _as_mask(result):
+    """
+    Turn the result of a pandas .str predicate into a plain boolean array (missing -> False).
+    """
+    return np.asarray(result.fillna(False), dtype=bool)
+
+def _text_series(series):
+    """
+    Stringify a column the way str(value) does, keeping missing values missing.
+    The result has object dtype so that .str methods follow Python's re and str
+    rules like the scalar cleaners; pandas' pyarrow-backed str dtype does not match
+    non-ASCII digits, and its $ does not match before a final newline.
+    """
+    return series.astype(str).astype(object)
+
+def _clean_distinct(series, clean, text=False):
+    """
+    Run a column cleaner on the distinct values only and broadcast the result back.
+    OCR'd columns repeat the same few values, so this saves most of the string work.
+    :param series: Column to clean; missing values map to NaN.
+    :param clean: Function cleaning a Series (object dtype) of distinct, non-missing values.
+    :param text: Hand clean the values as str(value), the way the scalar cleaners see them.
+        Only the distinct values are stringified when the column holds nothing but strings.
+    :return: Cleaned column with the same index.
+    """
+    if text and pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+        # Values that compare equal but print differently (1, 1.0, True) must stay apart
+        series = _text_series(series)
+    codes, uniques = pd.factorize(series)
+    values = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    cleaned = clean(_text_series(values) if text else values).to_numpy(dtype=object, na_value=np.nan)
+    result = np.full(len(series), np.nan, dtype=object)
+    found = codes >= 0
+    result[found] = cleaned[codes[found]]
+    return pd.Series(result, index=series.index, dtype=object)
+
+def _clean_time_values(value_str):
+    # One regex does the work of strip and the '| ETA' split. \d also matches
+    # non-ASCII digits, which int() reads, so the range check is done on the numbers
+    parts = value_str.str.extract(r'(?s)^\s*((\d{1,2}):(\d{2}))\s*(?:\|.*)?$')
+    matched = parts[0].notna()
+    hours = parts[1][matched].map(int)
+    minutes = parts[2][matched].map(int)
+    valid = pd.Series(False, index=parts.index)
+    valid[matched] = (hours <= 23) & (minutes <= 59)
+    return parts[0].where(valid, np.nan)
+
+def clean_time_format_column(series):
+    """
+    Vectorized clean_time_format: keep HH:MM / H:MM times (dropping a '| ...' suffix), NaN otherwise.
+    :param series: Column of raw time values.
+    :return: Cleaned column with the same index.
+    """
+    return _clean_distinct(series, _clean_time_values, text=True)
+
+def clean_time_columns(df, columns):
+    """
+    Clean several time columns at once with clean_time_format_column.
+    The columns are flattened into one array so the whole batch costs a few string ops.
+    :param df: DataFrame holding the columns.
+    :param columns: Names of the time columns.
+    :return: The DataFrame with the columns cleaned.
+    """
+    if not columns or len(df) == 0:
+        return df
+    values = pd.Series(df[columns].to_numpy(dtype=object).ravel(), dtype=object)
+    cleaned = clean_time_format_column(values).to_numpy(dtype=object).reshape(len(df), len(columns))
+    df[columns] = pd.DataFrame(cleaned, index=df.index, columns=columns)
+    return df
+
+def _clean_flight_code_values(flight_code):
+    flight_code = flight_code.str.strip()
+    spaced = _as_mask(flight_code.str.fullmatch(r'[A-Za-z0-9]{2}\s\d+'))
+    joined = _as_mask(flight_code.str.fullmatch(r'[A-Za-z0-9]{2}\d+')) & ~spaced
+    result = np.full(len(flight_code), np.nan, dtype=object)
+    result[spaced] = flight_code.to_numpy(dtype=object)[spaced]
+    result[joined] = (flight_code.str[:2] + ' ' + flight_code.str[2:]).to_numpy(dtype=object)[joined]
+    return pd.Series(result, dtype=object)
+
+def clean_flight_code_column(series):
+    """
+    Vectorized clean_flight_code: 'SV 123' is kept, 'SV123' becomes 'SV 123', anything else NaN.
+    :param series: Column of raw flight codes.
+    :return: Cleaned column with the same index.
+    """
+    return _clean_distinct(series, _clean_flight_code_values, text=True)
+
+def _check_3_letter_code_values(value):
+    valid = _as_mask(value.str.len() == 3) & _as_mask(value.str.isalpha())
+    return value.str.upper().where(valid, np.nan)
+
+def check_3_letter_code_column(series):
+    """
+    Vectorized check_3_letter_code: three-letter strings in upper case, NaN otherwise.
+    :param series: Column of raw airport codes.
+    :return: Cleaned column with the same index.
+    """
+    # Columns without any strings (e.g. all-NaN floats) have nothing to keep
+    if not (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+        return pd.Series(np.nan, index=series.index, dtype=object)
+    return _clean_distinct(series, _check_3_letter_code_values)
+
+def _extract_8_digits_values(prn_value):
+    return prn_value.str.strip().str.extract(r'^(\d{8})', expand=False)
+
+def extract_8_digits_column(series):
+    """
+    Vectorized extract_8_digits: first 8 digits of each PRN string, NaN otherwise.
+    :param series: Column of raw PRN values.
+    :return: Cleaned column with the same index.
+    """
+    if not (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+        return pd.Series(np.nan, index=series.index, dtype=object)
+    return _clean_distinct(series, _extract_8_digits_values)
+
 def clean_name(value):
     value_str = str(value).strip('.')  # Remove leading and trailing dots
     # Check if it's a valid name (non-numeric and only alphabetic characters)
@@ -146,7 +996,22 @@ def clean_name_columns(df, columns_to_clean):
     
     return df
 
-def clean_date_column(df):
+def _clean_date_values(value_str):
+
+    # Values already in MM/DD/YYYY format are kept as they are
+    already_clean = _as_mask(value_str.str.match(r'^\d{2}/\d{2}/\d{4}$'))
+
+    # DD.MM.YYYY is rearranged to MM/DD/YYYY
+    parts = value_str.str.strip().str.extract(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})$')
+    formatted_date = parts[1].str.zfill(2) + '/' + parts[0].str.zfill(2) + '/' + parts[2]
+
+    valid = np.full(len(value_str), np.nan, dtype=object)
+    converted = _as_mask(formatted_date.notna()) & ~already_clean
+    valid[converted] = formatted_date.to_numpy(dtype=object)[converted]
+    valid[already_clean] = value_str.to_numpy(dtype=object)[already_clean]
+    return pd.Series(valid, dtype=object)
+
+def clean_date_column(df, previous_date=None):
     """
     Cleans the 'Date' column in a DataFrame.
     Converts dates from DD.MM.YYYY to MM/DD/YYYY format and skips rows where the date is already in MM/DD/YYYY format.
@@ -154,59 +1019,502 @@ def clean_date_column(df):
     
     Args:
         df (pd.DataFrame): Input DataFrame containing a 'Date' column.
+        previous_date (str, optional): Last valid date seen before the first row,
+            used when only new rows of a longer history are cleaned.
     
     Returns:
         pd.DataFrame: DataFrame with the cleaned 'Date' column.
     """
-    previous_date = None  # To track the last valid date
+    # Missing or invalid dates take the last valid date (carried forward)
+    cleaned = _clean_distinct(df['Date'], _clean_date_values, text=True).ffill()
+    if previous_date is not None:
+        cleaned = cleaned.fillna(previous_date)
+    df['Date'] = cleaned
+    return df
+
 
-    def clean_date(value):
-        nonlocal previous_date
 
-        # Skip if value is already in MM/DD/YYYY format
-        if re.match(r'^\d{2}/\d{2}/\d{4}$', str(value)):
-            previous_date = value  # Update previous_date since it's valid
-            return value
+def load_image(image):
+    """
+    Return a PIL image for a path, an encoded image buffer or a PIL image.
+    :param image: Path to the image file, bytes of an encoded image, or a PIL image.
+    :return: PIL image.
+    """
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
 
-        if pd.isna(value) or value in ['Not found', '', None]:
-            return previous_date  # Use the last valid date if available
+class OcrBackend:
+    """
+    Interface of an OCR engine used by extract_text_from_image and extract_words_from_image.
+    """
 
-        # Ensure the value is a string and strip spaces
-        value = str(value).strip()
+    name = None
 
-        # Match the format DD.MM.YYYY
-        match = re.match(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})$', value)
-        if match:
-            # Extract day, month, year and rearrange to MM/DD/YYYY
-            day, month, year = match.groups()
-            formatted_date = f"{month.zfill(2)}/{day.zfill(2)}/{year}"
-            previous_date = formatted_date  # Update the last valid date
-            return formatted_date
+    def image_to_string(self, img):
+        """
+        :param img: PIL image.
+        :return: Recognised text.
+        """
+        raise NotImplementedError
 
-        # If parsing fails, return the previous valid date
-        return previous_date if previous_date else np.nan
+    def image_to_data(self, img):
+        """
+        :param img: PIL image.
+        :return: Word data in the layout of pytesseract.image_to_data(output_type=DICT):
+            lists under 'text', 'left', 'top', 'width', 'height', 'block_num', 'par_num', 'line_num'.
+        """
+        raise NotImplementedError
 
-    # Apply the cleaning function to the 'Date' column
-    df['Date'] = df['Date'].apply(clean_date)
-    return df
+    def version(self):
+        """
+        :return: Engine version string.
+        """
+        raise NotImplementedError
+
+
+class PytesseractBackend(OcrBackend):
+    """
+    Runs the tesseract binary through pytesseract; one process per call.
+    """
+
+    name = 'pytesseract'
+
+    def __init__(self, tesseract_cmd=DEFAULT_TESSERACT_CMD):
+        """
+        :param tesseract_cmd: Path of the tesseract binary.
+        """
+        self.tesseract_cmd = tesseract_cmd
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img)
+
+    def image_to_data(self, img):
+        return pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+
+    def version(self):
+        return str(pytesseract.get_tesseract_version())
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    Keeps a tesseract engine loaded in-process through the tesserocr binding, so the
+    language model is loaded once per worker thread instead of once per call.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, lang='eng', tessdata_path=None):
+        """
+        :param lang: Tesseract language.
+        :param tessdata_path: Folder of the traineddata files (tesserocr default if None).
+        """
+        if tesserocr is None:
+            raise RuntimeError("The tesserocr backend needs the 'tesserocr' package")
+        self.lang = lang
+        self.tessdata_path = tessdata_path
+        # An engine instance is not thread-safe; keep one per thread
+        self._local = threading.local()
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            kwargs = {'lang': self.lang}
+            if self.tessdata_path:
+                kwargs['path'] = self.tessdata_path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+        return api
+
+    def image_to_string(self, img):
+        api = self._api()
+        api.SetImage(img)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, img):
+        api = self._api()
+        api.SetImage(img)
+        api.Recognize()
+        data = {key: [] for key in ['text', 'left', 'top', 'width', 'height', 'block_num', 'par_num', 'line_num']}
+        block = par = line = 0
+        iterator = api.GetIterator()
+        level = tesserocr.RIL.WORD
+        if iterator is not None:
+            for word in tesserocr.iterate_level(iterator, level):
+                # Number blocks, paragraphs and lines the way tesseract's TSV output does
+                if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block, par, line = block + 1, 0, 0
+                if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    par, line = par + 1, 0
+                if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                box = word.BoundingBox(level)
+                text = word.GetUTF8Text(level)
+                if box is None or text is None:
+                    continue
+                left, top, right, bottom = box
+                data['text'].append(text)
+                data['left'].append(left)
+                data['top'].append(top)
+                data['width'].append(right - left)
+                data['height'].append(bottom - top)
+                data['block_num'].append(block)
+                data['par_num'].append(par)
+                data['line_num'].append(line)
+        return data
+
+    def version(self):
+        return tesserocr.tesseract_version().split()[1]
+
+
+OCR_BACKENDS = {
+    'pytesseract': PytesseractBackend,
+    'tesserocr': TesserocrBackend,
+}
+
+# OCR engine of this process; pytesseract unless configure_ocr_backend picks another
+OCR_BACKEND = PytesseractBackend()
+
+def configure_ocr_backend(name='pytesseract', tesseract_cmd=DEFAULT_TESSERACT_CMD):
+    """
+    Select the OCR engine of this process. Falls back to pytesseract when the
+    requested engine is unavailable.
+    :param name: Key of OCR_BACKENDS.
+    :param tesseract_cmd: Path of the tesseract binary (pytesseract backend).
+    """
+    global OCR_BACKEND
+    try:
+        OCR_BACKEND = PytesseractBackend(tesseract_cmd) if name == 'pytesseract' else OCR_BACKENDS[name]()
+    except (RuntimeError, KeyError) as e:
+        print(f"Warning: OCR backend {name!r} unavailable ({e}); using pytesseract")
+        OCR_BACKEND = PytesseractBackend(tesseract_cmd)
+    tesseract_version.cache_clear()
+
+@lru_cache(maxsize=None)
+def tesseract_version():
+    """
+    Version string of the OCR engine, part of every OCR cache key.
+    """
+    try:
+        return str(OCR_BACKEND.version())
+    except Exception:
+        return "unknown"
+
+def ocr_cache_key(img, kind, config=''):
+    """
+    Content-addressed cache key of an OCR call.
+    A crop is hashed on its own pixels, so its crop box is part of the key implicitly.
+    :param img: PIL image (full page or crop) that is OCR'd.
+    :param kind: 'string' for image_to_string, 'data' for image_to_data.
+    :param config: Tesseract config string of the call.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{kind}|{OCR_BACKEND.name}|{tesseract_version()}|{config}|{img.mode}|{img.size}|".encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
 
+class OcrCache:
+    """
+    Persistent OCR result cache in a SQLite file, keyed by ocr_cache_key.
+    Entries are evicted least-recently-used first once the stored text exceeds
+    max_bytes. Each process opens its own connection (pool workers included).
+
+    The total size is kept in the ocr_meta table by triggers, so a put does not
+    scan the cache. Hits update last_used in batches of TOUCH_BATCH (or every
+    TOUCH_SECONDS); a process that exits without flush() only loses some
+    recency updates, which makes eviction slightly less accurate.
+    """
+
+    TOUCH_BATCH = 256
+    TOUCH_SECONDS = 5.0
+
+    def __init__(self, path, max_bytes=DEFAULT_OCR_CACHE_MB * 1024 * 1024):
+        """
+        :param path: SQLite file; created if missing.
+        :param max_bytes: Size limit of the cached text.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+        self._touched = {}
+        self._touched_since = None
+
+    def _connect(self):
+        # A connection cannot be shared with forked workers; reopen per process
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS ocr_meta (name TEXT PRIMARY KEY, value INTEGER)")
+            # Summed once for caches created before the running total existed
+            self._connection.execute(
+                "INSERT OR IGNORE INTO ocr_meta VALUES ('total_size', (SELECT COALESCE(SUM(size), 0) FROM ocr))")
+            for trigger, event, change in [('insert', 'INSERT', 'new.size'),
+                                           ('update', 'UPDATE OF size', 'new.size - old.size'),
+                                           ('delete', 'DELETE', '-old.size')]:
+                self._connection.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS ocr_size_{trigger} AFTER {event} ON ocr BEGIN "
+                    f"UPDATE ocr_meta SET value = value + {change} WHERE name = 'total_size'; END")
+            self._connection.execute("COMMIT")
+            self._pid = os.getpid()
+            # Recency updates buffered by the parent are its own to write
+            self._touched = {}
+            self._touched_since = None
+        return self._connection
+
+    def get(self, key):
+        """
+        :param key: Cache key.
+        :return: Cached value, or None on a miss.
+        """
+        connection = self._connect()
+        row = connection.execute("SELECT value FROM ocr WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            METRICS.incr('ocr_cache_misses')
+            return None
+        self.hits += 1
+        METRICS.incr('ocr_cache_hits')
+        now = time.time()
+        self._touched[key] = now
+        if self._touched_since is None:
+            self._touched_since = now
+        if len(self._touched) >= self.TOUCH_BATCH or now - self._touched_since >= self.TOUCH_SECONDS:
+            self.flush()
+        return row[0]
+
+    def _write_touched(self, connection):
+        if self._touched:
+            connection.executemany("UPDATE ocr SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._touched.items()])
+        self._touched = {}
+        self._touched_since = None
+
+    def flush(self):
+        """
+        Write the buffered last_used updates of cache hits.
+        """
+        if not self._touched:
+            return
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN")
+            self._write_touched(connection)
+
+    def put(self, key, value):
+        """
+        Store a value and evict the least recently used entries if over the size limit.
+        :param key: Cache key.
+        :param value: Text to store.
+        """
+        connection = self._connect()
+        size = len(value.encode('utf-8'))
+        with connection:
+            connection.execute("BEGIN")
+            self._write_touched(connection)
+            connection.execute(
+                "INSERT INTO ocr VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, last_used = excluded.last_used",
+                (key, value, size, time.time()))
+            total = connection.execute("SELECT value FROM ocr_meta WHERE name = 'total_size'").fetchone()[0]
+            if total > self.max_bytes:
+                # Trim to 90% of the limit so eviction does not run on every put
+                excess = total - int(self.max_bytes * 0.9)
+                freed = 0
+                stale = []
+                for old_key, old_size in connection.execute("SELECT key, size FROM ocr ORDER BY last_used"):
+                    if freed >= excess:
+                        break
+                    stale.append((old_key,))
+                    freed += old_size
+                connection.executemany("DELETE FROM ocr WHERE key = ?", stale)
+
+    def stats(self):
+        """
+        :return: Dictionary with the hit and miss counters of this process.
+        """
+        return {'ocr_cache_hits': self.hits, 'ocr_cache_misses': self.misses}
+
+
+# OCR cache used by extract_text_from_image / extract_words_from_image (None = disabled)
+OCR_CACHE = None
+
+def configure_ocr_cache(path, max_mb=DEFAULT_OCR_CACHE_MB):
+    """
+    Enable (or with path=None disable) the persistent OCR cache for this process.
+    Also used as the process-pool initializer so every worker shares the same file.
+    :param path: SQLite file of the cache, or None.
+    :param max_mb: Size limit in MB.
+    """
+    global OCR_CACHE
+    OCR_CACHE = OcrCache(path, int(max_mb * 1024 * 1024)) if path else None
 
+# Minimum ink fraction a page needs to be OCRed, or None to OCR every page
+TRIAGE_THRESHOLD = None
+
+# Station the rows of this process are tagged with
+STATION = DEFAULT_STATION
+
+def configure_station(station=DEFAULT_STATION):
+    """
+    Set the station written into the rows extracted by this process.
+    """
+    global STATION
+    STATION = station
+
+def configure_triage(threshold=DEFAULT_TRIAGE_THRESHOLD):
+    """
+    Enable (or with threshold=None disable) page triage for this process.
+    :param threshold: Minimum ink fraction of the page and of its header band.
+    """
+    global TRIAGE_THRESHOLD
+    TRIAGE_THRESHOLD = threshold
+
+def _init_worker(cache_path, cache_mb, backend_name, tesseract_cmd, triage_threshold=None, station=DEFAULT_STATION):
+    """
+    Process-pool initializer: give the worker the parent's OCR cache, engine, triage setting and station.
+    """
+    global METRICS
+    # A forked worker inherits the parent's metrics, which drain() would hand back
+    # to be counted again; start empty. Not reset(): the inherited lock may be held.
+    METRICS = Metrics()
+    # Ctrl+C and SIGTERM (which systemd sends to the whole process group) are
+    # handled by the parent, which finishes the current PDF with its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    configure_ocr_cache(cache_path, cache_mb)
+    configure_ocr_backend(backend_name, tesseract_cmd)
+    configure_triage(triage_threshold)
+    configure_station(station)
+
+def _worker_args():
+    """
+    :return: Arguments of _init_worker reproducing this process's OCR setup.
+    """
+    cache_path = OCR_CACHE.path if OCR_CACHE is not None else None
+    cache_mb = OCR_CACHE.max_bytes / (1024 * 1024) if OCR_CACHE is not None else DEFAULT_OCR_CACHE_MB
+    return cache_path, cache_mb, OCR_BACKEND.name, getattr(OCR_BACKEND, 'tesseract_cmd', DEFAULT_TESSERACT_CMD), TRIAGE_THRESHOLD, STATION
+
+def _worker_pool(workers):
+    """
+    Process pool of OCR workers set up by _init_worker, with every worker started right away.
+    Call it before starting any thread: a worker forked while another thread holds
+    a lock (METRICS' for one) inherits the lock held and blocks on it forever.
+    :param workers: Number of worker processes.
+    :return: ProcessPoolExecutor.
+    """
+    executor = ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker, initargs=_worker_args())
+    # With the fork start method the first task starts all the workers at once
+    executor.submit(os.getpid).result()
+    return executor
 
 def extract_text_from_image(image_path):
     """
-    Extract text from an image using pytesseract.
-    :param image_path: Path to the image file.
+    Extract text from an image using the configured OCR backend (pytesseract by default).
+    Results are served from OCR_CACHE when the cache is enabled.
+    :param image_path: Path to the image file, bytes of an encoded image, or a PIL image.
     :return: Extracted text or an error message.
     """
     try:
-        # Open the image
-        img = Image.open(image_path)
+        # Open the image (images already in memory are used as they are)
+        img = load_image(image_path)
+        key = None
+        if OCR_CACHE is not None:
+            key = ocr_cache_key(img, 'string')
+            text = OCR_CACHE.get(key)
+            if text is not None:
+                return text
         # Use pytesseract to extract text
-        text = pytesseract.image_to_string(img)
+        METRICS.incr('ocr_calls')
+        METRICS.incr('ocr_pixels', img.width * img.height)
+        METRICS.incr('ocr_bytes', img.width * img.height * len(img.getbands()))
+        with METRICS.timer('ocr'):
+            text = OCR_BACKEND.image_to_string(img)
+        if key is not None:
+            OCR_CACHE.put(key, text)
         return text
     except Exception as e:
         return f"Error: {e}"
 
+def extract_words_from_image(image_path):
+    """
+    Run one layout OCR pass and return every recognised word with its box.
+    :param image_path: Path to the image file, bytes of an encoded image, or a PIL image.
+    :return: List of word dictionaries with text, left, top, width, height and
+        the block/par/line numbers tesseract assigned; empty on error.
+    """
+    try:
+        img = load_image(image_path)
+        key = None
+        data = None
+        if OCR_CACHE is not None:
+            key = ocr_cache_key(img, 'data')
+            cached = OCR_CACHE.get(key)
+            if cached is not None:
+                data = json.loads(cached)
+        if data is None:
+            METRICS.incr('ocr_calls')
+            METRICS.incr('ocr_pixels', img.width * img.height)
+            METRICS.incr('ocr_bytes', img.width * img.height * len(img.getbands()))
+            with METRICS.timer('ocr_layout'):
+                data = OCR_BACKEND.image_to_data(img)
+            if key is not None:
+                OCR_CACHE.put(key, json.dumps(data))
+    except Exception as e:
+        print(f"Error: {e}")
+        return []
+
+    words = []
+    for i, text in enumerate(data['text']):
+        if not text.strip():
+            continue
+        words.append({
+            'text': text,
+            'left': data['left'][i],
+            'top': data['top'][i],
+            'width': data['width'][i],
+            'height': data['height'][i],
+            'line': (data['block_num'][i], data['par_num'][i], data['line_num'][i]),
+        })
+    return words
+
+def words_in_box(words, box):
+    """
+    Select the words whose centre lies inside a crop box.
+    :param words: Word dictionaries from extract_words_from_image.
+    :param box: (left, top, right, bottom) box in page pixels.
+    :return: List of the words inside the box, in reading order.
+    """
+    left, top, right, bottom = box
+    return [w for w in words
+            if left <= w['left'] + w['width'] / 2 < right
+            and top <= w['top'] + w['height'] / 2 < bottom]
+
+def words_to_text(words):
+    """
+    Rebuild text from word boxes, one output line per tesseract line.
+    :param words: Word dictionaries from extract_words_from_image.
+    :return: Text in the same shape as image_to_string output.
+    """
+    lines = []
+    current_line = None
+    for word in words:
+        if word['line'] != current_line:
+            lines.append([])
+            current_line = word['line']
+        lines[-1].append(word['text'])
+    return "\n".join(" ".join(line) for line in lines)
+
 def format_extracted_text(raw_text):
     """
     Format extracted text by removing empty lines and unnecessary spaces.
@@ -230,193 +1538,1520 @@ def extract_data_using_patterns(formatted_text, patterns):
         extracted_data[key] = match.group(1) if match else "Not found"
     return extracted_data
 
-def main(img_folder):
+def clean_rows(df, previous_date=None):
     """
-    Main function to process the image and extract data points.
-    :param image_path: Path to the image file.
+    Apply every column cleaner to a DataFrame of extracted rows.
+    :param df: DataFrame with the output CSV columns.
+    :param previous_date: Last valid date before the first row (see clean_date_column).
+    :return: The cleaned DataFrame.
     """
+    df['Flight Arrival'] = clean_flight_code_column(df['Flight Arrival'])
+    df['Flight Departure'] = clean_flight_code_column(df['Flight Departure'])
+    # Apply the function to From and To columns
+    df['From'] = check_3_letter_code_column(df['From'])
+    df['To'] = check_3_letter_code_column(df['To'])
+    df['AC Type:'] = df['AC Type:'].str.replace(r'(From:|To:|nan,4|TW|TIA|FALSE|TIZ|LAAN|RANI|TIC|aD)', '', regex=True).str.strip()
+
+    # Clean all the time columns in one batch
+    df = clean_time_columns(df, TIME_COLUMNS)
+
+    df = clean_date_column(df, previous_date)
+    df.replace("Not found", "", inplace=True)
+    df = clean_name_columns(df, ['ARR NAME', 'DEP NAME'])
+    return df
+
 
+def _csv_row_key(values):
+    """
+    Build the duplicate-detection key of a row the way it appears in the CSV.
+    :param values: Iterable of cell values.
+    :return: Tuple of cell strings, with missing values as ''.
+    """
+    return tuple('' if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v) for v in values)
+
+
+def merge_records(old, new):
+    """
+    Upsert policy for two versions of the same record: every field takes the
+    newer value unless that value is empty, so a re-OCR can correct a field but
+    a missed field never erases one read earlier.
+    :param old: Stored row, as a list of CSV cell strings.
+    :param new: Incoming row, in the same layout.
+    :return: Merged row.
+    """
+    return [n if n != '' else o for o, n in zip(old, new)]
+
+
+class RecordStore:
+    """
+    Persistent hash index of the records in the output CSV, kept in SQLite next to it.
+
+    Records are keyed on their NATURAL_KEY values; rows with neither flight
+    number are keyed on their full contents instead, so unreadable pages are
+    only dropped when they repeat exactly. Each record keeps its position in the
+    CSV so the file can be regenerated in order after records were merged; a
+    merge sets the 'dirty' flag in the same transaction, so a CSV that is
+    missing a merged record is detected even after a crash.
+    """
+
+    def __init__(self, path, columns):
+        """
+        :param path: SQLite file; created if missing.
+        :param columns: Columns of the CSV rows.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self._key_indexes = [self.columns.index(c) for c in NATURAL_KEY if c in self.columns]
+        self._flight_indexes = [self.columns.index(c) for c in ['Flight Arrival', 'Flight Departure'] if c in self.columns]
+        # The sink may be driven from a writer thread (pipeline mode), one thread at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, position INTEGER, row TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.count = self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def get_meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+    def in_sync(self, csv_path):
+        """
+        :return: True if the index was last saved with this CSV file as it is now.
+        """
+        return (self.get_meta('columns') == self.columns and os.path.exists(csv_path)
+                and self.get_meta('csv_size') == os.path.getsize(csv_path))
+
+    def key(self, row):
+        if any(row[i] for i in self._flight_indexes):
+            return "\x1f".join(row[i] for i in self._key_indexes)
+        return "row:" + hashlib.sha256("\x1f".join(row).encode('utf-8')).hexdigest()
+
+    def upsert(self, row):
+        """
+        Insert a record, or merge it into the stored record with the same key.
+        :param row: Row as a list of CSV cell strings.
+        :return: Tuple of 'new', 'duplicate' (nothing changed) or 'merged', and
+            the record as stored afterwards.
+        """
+        key = self.key(row)
+        stored = self.conn.execute("SELECT row FROM records WHERE key = ?", (key,)).fetchone()
+        if stored is None:
+            self.conn.execute("INSERT INTO records (key, position, row) VALUES (?, ?, ?)", (key, self.count, json.dumps(row)))
+            self.count += 1
+            return 'new', row
+        old = json.loads(stored[0])
+        merged = merge_records(old, row)
+        if merged == old:
+            return 'duplicate', old
+        self.conn.execute("UPDATE records SET row = ? WHERE key = ?", (json.dumps(merged), key))
+        self.set_meta('dirty', True)
+        return 'merged', merged
+
+    @property
+    def dirty(self):
+        """
+        True if records were merged since the CSV was last rewritten from the index.
+        """
+        return bool(self.get_meta('dirty'))
+
+    def rebuild(self, rows):
+        """
+        Re-index the records of a CSV from scratch.
+        :param rows: Iterable of rows as lists of CSV cell strings, in file order.
+        :return: Number of rows merged into an earlier record.
+        """
+        self.conn.execute("DELETE FROM records")
+        self.count = 0
+        merged = sum(1 for row in rows if self.upsert(row)[0] != 'new')
+        return merged
+
+    def rows(self):
+        """
+        :return: Generator of the stored rows in CSV order.
+        """
+        for (row,) in self.conn.execute("SELECT row FROM records ORDER BY position"):
+            yield json.loads(row)
+
+    def commit(self, csv_path, previous_date=None, dirty=None):
+        """
+        Save the index together with the size of the CSV it now describes.
+        :param dirty: New value of the dirty flag; None leaves it unchanged.
+        """
+        if dirty is not None:
+            self.set_meta('dirty', dirty)
+        self.set_meta('columns', self.columns)
+        self.set_meta('csv_size', os.path.getsize(csv_path))
+        self.set_meta('previous_date', previous_date)
+        self.conn.commit()
+
+    def rollback(self):
+        """
+        Drop the changes made since the last commit.
+        """
+        self.conn.rollback()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class CsvResultSink:
+    """
+    Buffers extracted rows and appends them to the output CSV in batches.
+
+    Only the new rows are cleaned and written, so the cost of a flush does not
+    depend on how many rows the CSV already holds. Duplicates are found in a
+    persistent RecordStore keyed on NATURAL_KEY: a row for a turnaround already
+    in the file is merged into it (merge_records) instead of being appended, and
+    sync() rewrites the CSV from the index if any record changed. That happens
+    when the sink is opened (after a crash) or closed, and whenever the caller
+    asks for it. The existing file is only read in full when the index is
+    missing or out of date.
+    """
+
+    def __init__(self, csv_path=OUTPUT_CSV, flush_size=DEFAULT_FLUSH_SIZE, on_flush=None, writers=(), index_path=None):
+        """
+        :param csv_path: CSV file to append to; created with CSV_COLUMNS if missing.
+        :param flush_size: Number of buffered rows that triggers a flush.
+        :param on_flush: Optional callback receiving the tags of the rows of each
+            flush, called once those rows are safely on disk.
+        :param writers: Additional outputs (e.g. a ParquetDataset) whose write(df)
+            receives the cleaned rows of each flush: the new records, followed by
+            the merged version of every record a row was merged into.
+        :param index_path: RecordStore file; defaults to the CSV path + '.index.sqlite'.
+        """
+        self.csv_path = csv_path
+        self.flush_size = max(1, int(flush_size))
+        self.on_flush = on_flush
+        self.writers = list(writers)
+        self.rows = []
+        self.tags = []
+        self.rows_written = 0
+        self.columns = list(CSV_COLUMNS)
+        self.previous_date = None
+
+        if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+            with open(csv_path, newline='', encoding='utf-8') as f:
+                self.columns = next(csv.reader(f))
+        else:
+            pd.DataFrame(columns=self.columns).to_csv(csv_path, index=False)
+
+        self.store = RecordStore(index_path or csv_path + '.index.sqlite', self.columns)
+        if self.store.in_sync(csv_path):
+            self.previous_date = self.store.get_meta('previous_date')
+        else:
+            # First run with an index, or the CSV changed behind its back: index it once
+            with METRICS.timer('index_rebuild'):
+                self.store.rebuild(self._read_history())
+            self.store.commit(csv_path, self.previous_date)
+        # Merges of an earlier run that never reached the CSV
+        self.sync()
+
+    def _read_history(self):
+        date_index = self.columns.index('Date') if 'Date' in self.columns else None
+        with open(self.csv_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for record in reader:
+                record = (record + [''] * len(self.columns))[:len(self.columns)]
+                if date_index is not None and record[date_index]:
+                    self.previous_date = record[date_index]
+                yield record
+
+    def add(self, extracted_data, tag=None):
+        """
+        Queue one extracted row, flushing when the buffer is full.
+        :param extracted_data: Dictionary of field name to raw extracted value.
+        :param tag: Optional value handed to on_flush once the row is written.
+        """
+        self.rows.append({col: extracted_data.get(col, None) for col in self.columns})
+        if tag is not None:
+            self.tags.append(tag)
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Clean the buffered rows and append the ones not already in the CSV.
+        :return: Number of rows written.
+        """
+        if not self.rows:
+            return 0
+        with METRICS.timer('csv_flush'):
+            return self._flush()
+
+    def _flush(self):
+        df = pd.DataFrame(self.rows, columns=self.columns)
+        self.rows = []
+        for column in ['Flight Arrival', 'Flight Departure', 'From', 'To', 'AC Type:', 'Date', 'ARR NAME', 'DEP NAME'] + TIME_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+        with METRICS.timer('clean_rows'):
+            df = clean_rows(df, self.previous_date)[self.columns]
+        written = self.append_cleaned(df)
+
+        # Rows are on disk (or were duplicates); report them as committed
+        tags, self.tags = self.tags, []
+        if self.on_flush is not None and tags:
+            self.on_flush(tags)
+        return written
+
+    def append_cleaned(self, df):
+        """
+        Upsert rows that are already cleaned (e.g. another sink's output) and
+        append the new ones to the CSV.
+        :param df: DataFrame with this sink's columns.
+        :return: Number of rows appended.
+        """
+        # Append new records; merge rows of known records into them instead
+        keep = []
+        merged = []
+        csv_size = os.path.getsize(self.csv_path)
+        try:
+            with METRICS.timer('upsert'):
+                for values in df.itertuples(index=False, name=None):
+                    outcome, record = self.store.upsert(list(_csv_row_key(values)))
+                    keep.append(outcome == 'new')
+                    if outcome == 'merged':
+                        merged.append(record)
+                    METRICS.incr(UPSERT_COUNTERS[outcome])
+            df = df[keep]
+            if len(df):
+                with open(self.csv_path, 'a', newline='', encoding='utf-8') as f:
+                    df.to_csv(f, header=False, index=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            # Nothing of this batch is kept, so the index never lists rows the CSV lacks
+            self.store.rollback()
+            try:
+                os.truncate(self.csv_path, csv_size)
+            except OSError:
+                pass  # Detected by the size check when the sink is next opened
+            raise
+
+        dates = df['Date'][df['Date'].notna() & (df['Date'] != '')] if 'Date' in df.columns else []
+        if len(dates):
+            self.previous_date = dates.iloc[-1]
+        self.store.commit(self.csv_path, self.previous_date)
+
+        # The CSV gets merged records at the next sync(); the writers get them as new versions
+        versions = ([df] if len(df) else []) + ([pd.DataFrame(merged, columns=self.columns)] if merged else [])
+        if self.writers and versions:
+            versions = pd.concat(versions, ignore_index=True) if len(versions) > 1 else versions[0]
+            for writer in self.writers:
+                writer.write(versions)
+        self.rows_written += len(df)
+        return len(df)
+
+    def sync(self):
+        """
+        Rewrite the CSV from the record store if records were merged since the
+        last rewrite. Rows still buffered are not flushed.
+        :return: True if the CSV was rewritten.
+        """
+        if not self.store.dirty:
+            return False
+        with METRICS.timer('csv_rewrite'):
+            pd.DataFrame(list(self.store.rows()), columns=self.columns).to_csv(self.csv_path + '.tmp', index=False)
+            os.replace(self.csv_path + '.tmp', self.csv_path)
+        self.store.commit(self.csv_path, self.previous_date, dirty=False)
+        print(f"Rewrote {self.csv_path} with merged records")
+        return True
+
+    def close(self):
+        """
+        Flush any rows still buffered at the end of a run, and rewrite the CSV
+        from the record store if records were merged.
+        """
+        self.flush()
+        self.sync()
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _time_seconds(value):
+    """
+    :return: Seconds since midnight of a cleaned HH:MM time, None if missing.
+    """
+    match = re.match(r'^(\d{1,2}):(\d{2})$', value) if isinstance(value, str) else None
+    return int(match.group(1)) * 3600 + int(match.group(2)) * 60 if match else None
+
+
+def parquet_schema(columns):
+    """
+    Arrow schema of the Parquet output: time32 times, date32 dates,
+    dictionary-encoded CATEGORICAL_COLUMNS and strings for everything else.
+    :param columns: Column names, in file order.
+    :return: pyarrow.Schema.
+    """
+    fields = []
+    for column in columns:
+        if column in TIME_COLUMNS:
+            type_ = pa.time32('s')
+        elif column == 'Date':
+            type_ = pa.date32()
+        elif column in CATEGORICAL_COLUMNS:
+            type_ = pa.dictionary(pa.int32(), pa.string())
+        else:
+            type_ = pa.string()
+        fields.append(pa.field(column, type_))
+    return pa.schema(fields)
+
+
+def to_arrow_table(df, schema):
+    """
+    Convert cleaned rows (as written to the CSV) to an Arrow table of the given schema.
+    Empty strings and NaN become nulls.
+    :param df: DataFrame of cleaned rows.
+    :param schema: Output of parquet_schema.
+    :return: pyarrow.Table.
+    """
+    arrays = []
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        strings = [None if v is None or (not isinstance(v, str) and pd.isna(v)) or v == '' else str(v) for v in values]
+        if pa.types.is_time(field.type):
+            array = pa.array([_time_seconds(v) for v in strings], type=pa.int32()).cast(field.type)
+        elif pa.types.is_date(field.type):
+            dates = pd.to_datetime(pd.Series(strings, dtype=object), format='%m/%d/%Y', errors='coerce')
+            array = pa.array([None if pd.isna(d) else d.date() for d in dates], type=field.type)
+        elif pa.types.is_dictionary(field.type):
+            array = pa.array(strings, type=pa.string()).dictionary_encode()
+        else:
+            array = pa.array(strings, type=pa.string())
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _partition_value(value, default='unknown'):
+    value = '' if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value).strip()
+    return re.sub(r'[^\w.-]', '_', value) or default
+
+
+class ParquetDataset:
+    """
+    Columnar copy of the results, partitioned as root/station=<Station>/date=<YYYY-MM-DD>/.
+
+    Every write adds one small part-*.parquet file per partition it touches and
+    never rewrites existing files; compact() later merges the parts of each
+    partition into one file. Files are written under a hidden temporary name and
+    renamed into place, so readers never see a partial file.
+
+    A record merged in the CSV sink is written again as a new version, so until
+    the partition is compacted it can hold several versions of one record, the
+    newest in the newest part file. Readers that need the CSV's view of the data
+    should compact first.
+    """
+
+    def __init__(self, root, columns=CSV_COLUMNS):
+        """
+        :param root: Dataset folder; created on the first write.
+        :param columns: Columns of the rows handed to write().
+        """
+        if pa is None:
+            raise ImportError("The Parquet output needs pyarrow (pip install pyarrow)")
+        self.root = root
+        self.schema = parquet_schema([c for c in columns if c != PARTITION_COLUMN])
+        self.files_written = 0
+
+    def partition_path(self, station, date):
+        return os.path.join(self.root, f"station={_partition_value(station)}", f"date={_partition_value(date)}")
+
+    def write(self, df):
+        """
+        Append cleaned rows as new files, one per (station, date) partition.
+        :param df: DataFrame of cleaned rows (the CSV layout).
+        """
+        if not len(df):
+            return
+        stations = df[PARTITION_COLUMN] if PARTITION_COLUMN in df.columns else pd.Series(None, index=df.index, dtype=object)
+        dates = pd.to_datetime(df['Date'], format='%m/%d/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+        keys = [(_partition_value(s), _partition_value(d)) for s, d in zip(stations, dates)]
+        with METRICS.timer('parquet_write'):
+            for station, date in dict.fromkeys(keys):
+                rows = df[[key == (station, date) for key in keys]]
+                folder = self.partition_path(station, date)
+                os.makedirs(folder, exist_ok=True)
+                name = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+                table = self.latest_versions(to_arrow_table(rows, self.schema))
+                pq.write_table(table, os.path.join(folder, f".{name}.tmp"))
+                os.replace(os.path.join(folder, f".{name}.tmp"), os.path.join(folder, name))
+                self.files_written += 1
+                METRICS.incr('parquet_files')
+
+    @staticmethod
+    def latest_versions(table):
+        """
+        Keep the last version of every record, keyed like RecordStore.key: on
+        NATURAL_KEY when a flight number is set, on the whole row otherwise.
+        :param table: pyarrow.Table of one partition, oldest rows first.
+        :return: pyarrow.Table.
+        """
+        key_columns = [c for c in NATURAL_KEY if c in table.column_names]
+        flight_columns = [c for c in ['Flight Arrival', 'Flight Departure'] if c in table.column_names]
+        rows = table.to_pylist()
+        latest = {}
+        for i, row in enumerate(rows):
+            if any(row[c] for c in flight_columns):
+                latest[tuple(row[c] for c in key_columns)] = i
+            else:
+                latest[('row',) + tuple(row.values())] = i
+        return table.take(sorted(latest.values())) if len(latest) < len(rows) else table
+
+    def compact(self):
+        """
+        Merge the part files of every partition into a single file, keeping
+        only the latest version of each record.
+        The merged file is renamed into place before the parts are removed, so a
+        crash can leave duplicate rows behind but never loses any.
+        :return: Number of partitions compacted.
+        """
+        compacted = 0
+        for folder, _dirs, files in os.walk(self.root):
+            parts = sorted(f for f in files if f.startswith('part-') and f.endswith('.parquet'))
+            if len(parts) < 2:
+                continue
+            with METRICS.timer('parquet_compact'):
+                # Part names start with their write time, so this is oldest first
+                table = pa.concat_tables([pq.ParquetFile(os.path.join(folder, f)).read() for f in parts])
+                table = self.latest_versions(table)
+                name = f"part-{time.time_ns()}-{os.getpid()}-compacted.parquet"
+                pq.write_table(table, os.path.join(folder, f".{name}.tmp"))
+                os.replace(os.path.join(folder, f".{name}.tmp"), os.path.join(folder, name))
+                for f in parts:
+                    os.remove(os.path.join(folder, f))
+            print(f"Compacted {len(parts)} file(s) in {folder} ({table.num_rows} rows)")
+            compacted += 1
+        return compacted
+
+
+def crop_regions(img, regions=None, origin=(0, 0)):
+    """
+    Cut the header regions out of a page image, in memory.
+    :param img: PIL image of the full page, or of a page band starting at origin.
+    :param regions: Dictionary of region name to crop box in pixels at DEFAULT_DPI;
+        defaults to HEADER_REGIONS. A right edge of None means the right edge of the page.
+        Boxes are scaled to the DPI recorded in the image.
+    :param origin: Top-left corner of img on the page, at DEFAULT_DPI.
+    :return: Dictionary of region name to cropped PIL image.
+    """
+    if regions is None:
+        regions = HEADER_REGIONS
+    dpi = image_dpi(img)
+    crops = {}
+    with METRICS.timer('crop'):
+        for name, box in regions.items():
+            crops[name] = img.crop(scale_box(box, dpi, img.width, origin))
+    return crops
+
+
+def ink_density(img):
+    """
+    :param img: PIL image.
+    :return: Fraction of its pixels darker than INK_LEVEL.
+    """
+    pixels = np.asarray(img.convert('L'))
+    return float((pixels < INK_LEVEL).mean()) if pixels.size else 0.0
+
+
+def triage_page(img, threshold=DEFAULT_TRIAGE_THRESHOLD):
+    """
+    Decide from a thumbnail whether a page is a coversheet worth OCRing.
+    A coversheet has ink on the page and in its HEADER_BAND; blank backs, and
+    pages whose header area is empty (annexes, stray scans), fail the check.
+    :param img: PIL image of the full page.
+    :param threshold: Minimum ink fraction of both the page and its header band;
+        higher values skip more pages.
+    :return: Tuple of (is a coversheet, page ink fraction, header ink fraction).
+    """
+    with METRICS.timer('triage'):
+        # Sampling every TRIAGE_REDUCE-th pixel keeps thin strokes at full contrast
+        # (averaging would wash them out) and estimates the ink fraction without bias
+        thumbnail = img.resize((max(1, img.width // TRIAGE_REDUCE), max(1, img.height // TRIAGE_REDUCE)), Image.NEAREST)
+        band = scale_box(HEADER_BAND, image_dpi(img) / TRIAGE_REDUCE, thumbnail.width)
+        page_ink = ink_density(thumbnail)
+        header_ink = ink_density(thumbnail.crop(band))
+    return page_ink >= threshold and header_ink >= threshold, page_ink, header_ink
+
+
+def extract_header_fields(img, words=None, page_width=None, header=None):
+    """
+    OCR the header regions of a page (PRNs, names, flights, From/To, AC Type).
+    The crops are handed straight to the OCR engine without temporary files.
+    When word boxes (from a layout OCR pass or a PDF text layer) are given, each
+    region is read from the words inside its box instead and no OCR call is made.
+    :param img: PIL image of the full page (may be None when words are given).
+    :param words: Optional word boxes in the layout of extract_words_from_image.
+    :param page_width: Page width in pixels when there is no image.
+    :param header: Optional HEADER_BAND image of the page at a higher resolution
+        than img; the regions are cropped from it instead of from img.
+    :return: Dictionary of extracted header fields.
+    """
+    crops = dict.fromkeys(HEADER_REGIONS)
+    texts = dict.fromkeys(HEADER_REGIONS)
+    if words is None:
+        crops = crop_regions(header, origin=HEADER_BAND[:2]) if header is not None else crop_regions(img)
+    else:
+        # Word boxes are in pixels of the image they were read from (DEFAULT_DPI for a text layer)
+        dpi = image_dpi(img) if img is not None else DEFAULT_DPI
+        width = page_width if page_width is not None else img.width
+        for name, box in HEADER_REGIONS.items():
+            texts[name] = words_to_text(words_in_box(words, scale_box(box, dpi, width)))
+
+    extracted_data = {}
+    with METRICS.timer('main3'):
+        extracted_data.update(main3(crops["ARR"], texts["ARR"]))
+    with METRICS.timer('main2'):
+        extracted_data.update(main2(crops["DEP"], texts["DEP"]))
+    for field in ["Flight Arrival", "Flight Departure", "From", "To", "AC Type:"]:
+        with METRICS.timer('main6'):
+            extracted_data.update(main6(field, crops[field], texts[field]))
+    return extracted_data
+
+
+def process_page(file_path, ocr_mode='crops'):
+    """
+    OCR one coversheet page and extract all of its fields.
+    :param file_path: Path to the PNG page, or to the word file of a text-layer page.
+    :param ocr_mode: 'crops' OCRs the page and then every header region separately,
+        'layout' makes a single word-box OCR pass and reads every field from it,
+        'compare' runs both, prints the fields where they differ and returns the
+        'crops' result.
+    :return: Dictionary of extracted data for the page, or None if triage
+        (TRIAGE_THRESHOLD) found it is not a coversheet.
+    """
+    if file_path.endswith(WORDS_SUFFIX):
+        # Digital page: fields come straight from the embedded text layer
+        with open(file_path, encoding='utf-8') as f:
+            page = json.load(f)
+        extracted_data = extract_fields(words_to_text(page['words']), words=page['words'], page_width=page['width'])
+        METRICS.record_page(file_path, 'text_layer')
+        return _finish_page(extracted_data)
+
+    # Decode the page once; the full-page OCR and the header crops share it
+    with METRICS.timer('image_open'):
+        img = Image.open(file_path)
+        img.load()
+        header = None
+        header_path = file_path[:-len('.png')] + HEADER_SUFFIX
+        if os.path.exists(header_path):
+            header = Image.open(header_path)
+            header.load()
+
+    if TRIAGE_THRESHOLD is not None:
+        is_coversheet, page_ink, header_ink = triage_page(img, TRIAGE_THRESHOLD)
+        if not is_coversheet:
+            METRICS.record_page(file_path, 'skipped')
+            print(f"Skipping {file_path}: not a coversheet (ink {page_ink:.4f}, header ink {header_ink:.4f})")
+            return None
+    METRICS.record_page(file_path, 'ocr')
+
+    if ocr_mode == 'compare':
+        extracted_data = extract_page_fields(img, 'crops', header)
+        differences = compare_extracted_data(extracted_data, extract_page_fields(img, 'layout'))
+        for key, (crops_value, layout_value) in differences.items():
+            print(f"{file_path}: {key!r} crops={crops_value!r} layout={layout_value!r}")
+        print(f"{file_path}: {len(differences)} field(s) differ between crops and layout OCR")
+    else:
+        extracted_data = extract_page_fields(img, ocr_mode, header)
+    return _finish_page(extracted_data)
+
+
+def _finish_page(extracted_data):
+    """
+    Tag a page's extracted data with its station and count its fields.
+    """
+    extracted_data['Station'] = STATION
+    not_found = sum(1 for value in extracted_data.values() if value in ("Not found", None))
+    METRICS.incr('fields_not_found', not_found)
+    METRICS.incr('fields_found', len(extracted_data) - not_found)
+    METRICS.incr('pages_processed')
+    print(extracted_data)
+    return extracted_data
+
+
+def compare_extracted_data(crops_data, layout_data):
+    """
+    List the fields on which the two OCR modes disagree.
+    :param crops_data: Extracted data from the multi-crop path.
+    :param layout_data: Extracted data from the layout path.
+    :return: Dictionary of field name to (crops value, layout value).
+    """
+    differences = {}
+    for key in list(crops_data) + [k for k in layout_data if k not in crops_data]:
+        crops_value = crops_data.get(key)
+        layout_value = layout_data.get(key)
+        if crops_value != layout_value:
+            differences[key] = (crops_value, layout_value)
+    return differences
+
+
+def extract_page_fields(img, ocr_mode='crops', header=None):
+    """
+    Extract the time chart and header fields of a decoded page.
+    :param img: PIL image of the full page.
+    :param ocr_mode: 'crops' (one OCR call per region) or 'layout' (one call per page).
+    :param header: Optional higher-resolution HEADER_BAND image the 'crops' mode reads the header from.
+    :return: Dictionary of extracted data.
+    """
+    words = None
+    if ocr_mode == 'layout':
+        words = extract_words_from_image(img)
+        raw_text = words_to_text(words)
+    elif ocr_mode == 'crops':
+        raw_text = extract_text_from_image(img)
+    else:
+        raise ValueError(f"Unknown OCR mode: {ocr_mode}")
+    return extract_fields(raw_text, img, words, header=header if words is None else None)
+
+
+def extract_fields(raw_text, img=None, words=None, page_width=None, header=None):
+    """
+    Extract the time chart from a page's text and its header fields from its
+    image or word boxes.
+    :param raw_text: Full-page text.
+    :param img: PIL image of the page (needed when words is None).
+    :param words: Optional word boxes of the page.
+    :param page_width: Page width in pixels when there is no image.
+    :param header: Optional higher-resolution HEADER_BAND image (see extract_header_fields).
+    :return: Dictionary of extracted data.
+    """
+    # Format the extracted text
+    formatted_text = format_extracted_text(raw_text)
+    formatted_text = formatted_text.replace("|", "")
+    print(formatted_text)
+    # Extract the time chart in a single scan over the text
+    with METRICS.timer('time_chart_regex'):
+        extracted_data = extract_time_chart(formatted_text)
+    extracted_data.update(extract_header_fields(img, words, page_width, header))
+    return extracted_data
+
+
+def _process_page_safe(file_path, ocr_mode='crops', drain_metrics=False, profile_every=0, profile_dir=None):
+    """
+    Run process_page, turning any failure into an error message so that one
+    bad page does not stop the batch.
+    :param file_path: Path to the PNG page.
+    :param ocr_mode: OCR mode passed on to process_page.
+    :param drain_metrics: Hand this process's metrics back with the result (pool workers).
+    :param profile_every: Profile every Nth page of this process with cProfile (0 = never).
+    :param profile_dir: Folder receiving the .prof files of profiled pages.
+    :return: Tuple of (file_path, extracted data or None, error message or None,
+        drained metrics or None).
+    """
+    global _PAGES_SEEN
+    _PAGES_SEEN += 1
+    profiler = None
+    if profile_every and (_PAGES_SEEN - 1) % profile_every == 0:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with METRICS.timer('page'):
+            result = file_path, process_page(file_path, ocr_mode), None
+    except Exception as e:
+        METRICS.incr('pages_failed')
+        result = file_path, None, f"Error: {e}"
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(profile_dir or '.', exist_ok=True)
+        name = "_".join(os.path.normpath(file_path).split(os.sep)[-2:])
+        profiler.dump_stats(os.path.join(profile_dir or '.', f"{os.getpid()}_{name}.prof"))
+    return result + (METRICS.drain() if drain_metrics else None,)
+
+
+# Pages handled by this process, for profile sampling
+_PAGES_SEEN = 0
+
+
+def iter_page_files(img_folder):
+    """
+    List the pages (PNG images and text-layer word files) of every PDF sub-folder in the IMG directory.
+    :param img_folder: Folder holding one sub-folder of PNG pages per PDF.
+    :return: Generator of page file paths.
+    """
     # Loop through each folder inside the IMG directory
     for folder_name in os.listdir(img_folder):
         folder_path = os.path.join(img_folder, folder_name)
 
         # Check if it's a directory (not a file)
         if os.path.isdir(folder_path):
-            # Loop through PNG files in the current folder
-            for file_name in os.listdir(folder_path):
-                if file_name.endswith('.png'):
-                    file_path = os.path.join(folder_path, file_name)
-                    raw_text = extract_text_from_image(file_path)
-                    # Format the extracted text
-                    formatted_text = format_extracted_text(raw_text)
-                    formatted_text = formatted_text.replace("|", "")
-                    print(formatted_text)
-                    # Define regex patterns for data extraction
-                    patterns = {
-                        "Date": r"Date:\s*(\d{2}\.\d{2}\.\d{4})",
-                        # "Flight Arrival": r"Flight Arrival:\s*([A-Z0-9]{2,3} \d+)",  # Support for D3, SV, etc.
-                        # "Flight Departure": r"Flight Departure:\s*([A-Z0-9]{2,3} \d+)",  # Adjusted for D3 169
-                        # "AC Type:": r"AC Type::\s*([^\s]+)",
-                        # "From": r"From:\s*([^\s]+)",
-                        # "To": r"To:\s*([^\s]+)",
-                        "STA": r"STA:\s*(\d{2}:\d{2})",
-                        "ETA": r"ETA:\s*(\d{2}:\d{2})",
-                        "ATA": r"ATA:\s*(\d{2}:\d{2})",
-                        "STD": r"STD:\s*(\d{2}:\d{2})",
-                        "ETD": r"ETD:\s*(\d{2}:\d{2})?",
-                        "ATD": r"ATD:\s*(\d{2}:\d{2})?",
-                        # "ARR PRN": r"(?:COORDINATION SHEET / TIME CHART|TC/TOC:)\s*(\d{8}/[A-Z])",  # Match 8 digits with letter
-                        # "DEP PRN": r"(?:COORDINATION SHEET / TIME CHART|TC/TOC:)\s*\d{8}/[A-Z]\s+(\d{8}/[A-Z])",
-                        # "ARR NAME": r"TC/TOC:\s*[^\s]+ [^\s]+\s+([^\d]+)",
-                        # "DEP NAME": r"TC/TOC:\s*[^\s]+ [^\s]+\s+[^\d]+\s+([^\d]+)",
-                        "Blocks In": r"Blocks In\s*(\d{2}:\d{2})",
-                        "Position PLB/Step": r"Position PLB/Step\s*(\d{2}:\d{2})",
-                        "Open Door": r"Open Door\s*(\d{2}:\d{2})",
-                        "Passenger Deplane Start": r"Passenger Deplane\s*(\d{2}:\d{2})",
-                        "Passenger Deplane Finish": r"Passenger Deplane\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Cabin Cleaning Start": r"Cabin Cleaning\s*(\d{2}:\d{2})",
-                        "Cabin Cleaning Finish": r"Cabin Cleaning\s*\d{2}:\d{2}.*\s*(\d{2}:\d{2})",
-                        "Customs Clearance Start":r"Customs Clearance\s*(\d{2}:\d{2})",
-                        "Customs Clearance Finish":r"Customs Clearance\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Cabin Cleaning start":r"Cabin Cleaning\s*(\d{2}:\d{2})",
-                        "Cabin Cleaning Finish":r"Cabin Cleaning\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Galley Services Start": r"Galley Services\s*(\d{2}:\d{2})",
-                        "Galley Services Finish": r"Galley Services\s*\d{2}:\d{2}.*\s*(\d{2}:\d{2})",
-                        "Cabin Security Check Start": r"Cabin Security Check\s*(\d{2}:\d{2})",
-                        "Cabin Security Check Finish": r"Cabin Security Check\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Boarding Clearance": r"Boarding Clearance\s*(\d{2}:\d{2})",
-                        "Passengers Enplane Start": r"Passengers Enplane\s*(\d{2}:\d{2})",
-                        "Passengers Enplane Finish": r"Passengers Enplane\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "TOP Finalization Start":r"TOP Finalization\s*(\d{2}:\d{2})",
-                        "TOP Finalization Finish":r"TOP Finalization\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "FWD Unloading Start":r"FWD Unloading\s*(\d{2}:\d{2})",
-                        "FWD Unloading Finish":r"FWD Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "FWD Leading Start":r"FWD Loading\s*(\d{2}:\d{2})",
-                         "FWD Leading Finish":r"FWD Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "AFT Unloading Start":r"AFT Unloading\s*(\d{2}:\d{2})",
-                        "AFT Unloading Finish":r"AFT Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "AFT Loading Start":r"AFT Loading\s*(\d{2}:\d{2})",
-                        "AFT Loading Finish":r"AFT Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                         "Bulk Unloading Start":r"Bulk Unloading\s*(\d{2}:\d{2})",
-                        "Bulk Unloading Finish":r"Bulk Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Bulk Loading Start":r"Bulk Loading\s*(\d{2}:\d{2})",
-                        "Bulk Loading Finish":r"Bulk Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "GPU/ACU Support Start":r"GPU/ACU Support\s*(\d{2}:\d{2})",
-                         "GPU/ACU Support Finish":r"GPU/ACU Support\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Refueling Start":r"Refueling\s*(\d{2}:\d{2})",
-                        "Refueling Finish":r"Refueling\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
-                        "Remove PLB/Step":r"Remove PLB/Step\s*(\d{2}:\d{2})",
-                        "Close Door": r"Close Door\s*(\d{2}:\d{2})",
-                        "Pushback/Block-out": r"Pushback/Block-out\s*(\d{2}:\d{2})",
-
-                    }
-
-
-                    # Extract data
-                    extracted_data = extract_data_using_patterns(formatted_text, patterns)
-                    img = Image.open(file_path)
-                    crop_box = (1395, 130, img.width, 200)
-                    crop_box2 = (1195, 130,1400 , 200)
-                    crop_box3 = (250, 190,400 , 250)
-                    crop_box4 = (250, 250,400 , 300)
-                    crop_box5 = (650, 190,800 , 250)
-                    crop_box6 = (650, 250,800 , 300)
-                    crop_box7 = (650, 150,800 , 190)
-
-                    cropped_img = img.crop(crop_box)
-                    cropped_img.save("cropped_image.png")
-
-                    cropped_img2 = img.crop(crop_box2)
-                    cropped_img2.save("cropped_image2.png")
-
-                    cropped_img3 = img.crop(crop_box3)
-                    cropped_img3.save("cropped_image3.png")
-
-                    cropped_img4 = img.crop(crop_box4)
-                    cropped_img4.save("cropped_image4.png")
-
-                    cropped_img5 = img.crop(crop_box5)
-                    cropped_img5.save("cropped_image5.png")
-
-                    cropped_img6 = img.crop(crop_box6)
-                    cropped_img6.save("cropped_image6.png")
-
-                    cropped_img7 = img.crop(crop_box7)
-                    cropped_img7.save("cropped_image7.png")
-
-                    dep=main2('cropped_image.png')
-                    arr=main3('cropped_image2.png')
-                    flight_arr=main6("Flight Arrival",'cropped_image3.png')
-                    flight_dep=main6("Flight Departure",'cropped_image4.png')
-                    from_=main6("From",'cropped_image5.png')
-                    to_=main6("To",'cropped_image6.png')
-                    ac_=main6("AC Type:",'cropped_image7.png')
-
-                    extracted_data.update(arr)
-                    extracted_data.update(dep)
-                    extracted_data.update(flight_arr)
-                    extracted_data.update(flight_dep)
-                    extracted_data.update(from_)
-                    extracted_data.update(to_)
-                    extracted_data.update(ac_)
-                
-                    extracted_data['Station'] = "RUH"
-                    print(extracted_data)
-                    df = pd.read_csv('CRS - RUH copy.csv')
-                    new_row_aligned = {col: extracted_data.get(col, None) for col in df.columns}
-                    # Append the new row as a DataFrame
-                    new_row_df = pd.DataFrame([new_row_aligned])
-
-                    # Append to the original DataFrame
-                    df = pd.concat([df, new_row_df], ignore_index=True)
-                    # Save the updated DataFrame back to the CSV file
-
-                    df['Flight Arrival'] = df['Flight Arrival'].apply(clean_flight_code)
-                    df['Flight Departure'] = df['Flight Departure'].apply(clean_flight_code)
-                    # Apply the function to From and To columns
-                    df['From'] = df['From'].apply(check_3_letter_code)
-                    df['To'] = df['To'].apply(check_3_letter_code)
-                    df['AC Type:'] = df['AC Type:'].str.replace(r'(From:|To:|nan,4|TW|TIA|FALSE|TIZ|LAAN|RANI|TIC|aD)', '', regex=True).str.strip()
-                    columns_to_clean = ['STA', 'ETA', 'ATA', 'STD', 'ETD', 'ATD','Blocks In',
-                        'Position PLB/Step', 'Open Door', 'Passenger Deplane Start',
-                        'Passenger Deplane Finish', 'Customs Clearance Start',
-                        'Customs Clearance Finish', 'Cabin Cleaning start',
-                        'Cabin Cleaning Finish', 'Galley Services Start',
-                        'Galley Services Finish', 'Cabin Security Check Start',
-                        'Cabin Security Check Finish', 'Boarding Clearance',
-                        'Passengers Enplane Start', 'Passengers Enplane Finish',
-                        'TOP Finalization Start', 'TOP Finalization Finish',
-                        'FWD Unloading Start', 'FWD Unloading Finish', 'FWD Leading Start',
-                        'FWD Leading Finish', 'AFT Unloading Start', 'AFT Unloading Finish',
-                        'AFT Loading Start', 'AFT Loading Finish', 'Bulk Unloading Start',
-                        'Bulk Unloading Finish', 'Bulk Loading Start', 'Bulk Loading Finish',
-                        'GPU/ACU Support Start', 'GPU/ACU Support Finish', 'Refueling Start',
-                        'Refueling Finish', 'Close Door', 'Remove PLB/Step',
-                        'Pushback/Block-out']
-
-                    # Apply the function to all the specified columns
-                    for column in columns_to_clean:
-                        df[column] = df[column].apply(clean_time_format)
+            yield from iter_pdf_page_files(folder_path)
 
-                   
-                    df = clean_date_column(df)
-                    df.replace("Not found", "", inplace=True)
-                    df = clean_name_columns(df, ['ARR NAME', 'DEP NAME'])
-                    df = df.drop_duplicates()
-                    # df = df.dropna(subset=['Flight Arrival', 'Flight Departure'], how='all')
-                
-                    df.to_csv('CRS - RUH copy.csv', index=False)
 
-                   
+def iter_pdf_page_files(folder_path):
+    """
+    List the pages saved for one PDF.
+    :param folder_path: Sub-folder of the IMG directory.
+    :return: Generator of page file paths.
+    """
+    for file_name in os.listdir(folder_path):
+        if is_page_file(file_name):
+            yield os.path.join(folder_path, file_name)
 
 
-def main2(image_path):
+def extract_time_chart(formatted_text):
+    """
+    Extract the date, schedule times and every start/finish pair of the time chart.
+    All activity labels are found in one pass of the precompiled TIME_CHART_SCANNER;
+    each label is handled once and its start and finish times are captured together.
+    The result has the same keys and values as running extract_data_using_patterns
+    with one regex per field.
+    :param formatted_text: The formatted page text.
+    :return: Dictionary of field name to time (or "Not found").
+    """
+    extracted_data = {"Date": "Not found"}
+    for _label, start_keys, finish_key, _mode in TIME_CHART_LABELS:
+        for key in start_keys:
+            extracted_data[key] = "Not found"
+        if finish_key:
+            extracted_data[finish_key] = "Not found"
+
+    match = DATE_PATTERN.search(formatted_text)
+    if match:
+        extracted_data["Date"] = match.group(1)
+
+    start_done = set()
+    finish_done = set()
+    for match in TIME_CHART_SCANNER.finditer(formatted_text):
+        label = match.group('label')
+        _label, start_keys, finish_key, mode = TIME_CHART_SPECS[label]
+        first = match.group('first')
+
+        # The first occurrence with a time gives the start; 'optional' labels
+        # take their first occurrence even when no time follows
+        if label not in start_done and (first or mode == 'optional'):
+            for key in start_keys:
+                extracted_data[key] = first
+            start_done.add(label)
+
+        if not finish_key or label in finish_done or not first:
+            continue
+        if mode == 'rest_of_line':
+            # Last time reachable after the start time, as r"\d{2}:\d{2}.*\s*(\d{2}:\d{2})" finds it
+            finish = LAST_TIME_PATTERN.match(formatted_text, match.end('first'))
+            finish = finish.group(1) if finish else None
+        else:
+            finish = match.group('second')
+        if finish:
+            extracted_data[finish_key] = finish
+            finish_done.add(label)
+    return extracted_data
+
+
+def main(img_folder, output_csv=OUTPUT_CSV, flush_size=DEFAULT_FLUSH_SIZE, workers=1, ocr_mode='crops', manifest=None,
+         report_path=None, profile_every=0, profile_dir='profiles', writers=()):
     """
     Main function to process the image and extract data points.
-    :param image_path: Path to the image file.
+    :param img_folder: Folder holding one sub-folder of PNG pages per PDF.
+    :param output_csv: CSV file the cleaned rows are appended to.
+    :param flush_size: Number of rows buffered before they are written out.
+    :param workers: Number of processes OCRing pages; 1 processes them in this process.
+    :param ocr_mode: 'crops', 'layout' or 'compare' (see process_page).
+    :param manifest: Optional Manifest; pages it lists are skipped, and every page
+        is recorded in it once its row has been written to the CSV.
+    :param report_path: Write the METRICS run report here (.prom for Prometheus text, JSON otherwise).
+    :param profile_every: cProfile every Nth page of each process into profile_dir (0 = off).
+    :param profile_dir: Folder for the page profiles.
+    :param writers: Additional outputs for the cleaned rows (see CsvResultSink).
+    """
+    process = partial(_process_page_safe, ocr_mode=ocr_mode, drain_metrics=workers > 1,
+                      profile_every=profile_every, profile_dir=profile_dir)
+    page_files, page_hashes = pending_pages(list(iter_page_files(img_folder)), manifest)
+    sink = CsvResultSink(output_csv, flush_size=flush_size,
+                         on_flush=manifest.mark_pages if manifest is not None else None, writers=writers)
+
+    if workers > 1:
+        # Pages are spread over the pool; map() hands results back in page
+        # order so the CSV comes out exactly as in a serial run. Workers use
+        # the same OCR cache file and engine as this process.
+        executor = _worker_pool(workers)
+        results = executor.map(process, page_files)
+    else:
+        executor = None
+        results = map(process, page_files)
+
+    try:
+        write_results(results, sink, page_hashes)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        # Write whatever is still buffered once the run ends
+        sink.close()
+    finish_run(report_path)
+
+
+def pipeline(pdf_folder='PDF', img_folder='IMG', output_csv=OUTPUT_CSV, flush_size=DEFAULT_FLUSH_SIZE, ocr_workers=1,
+             raster_workers=1, queue_size=DEFAULT_PIPELINE_QUEUE, ocr_mode='crops', manifest=None, report_path=None,
+             profile_every=0, profile_dir='profiles', raster_options=None, writers=()):
+    """
+    Rasterize, OCR and write in one pass, with the stages running concurrently:
+
+        rasterizer threads -> page queue -> OCR/extraction processes -> result queue -> writer thread
+
+    A page is handed to the OCR pool as soon as it is saved and its row is
+    cleaned and appended as soon as it is extracted, so the first rows reach
+    the CSV while later PDFs are still being rasterized. Both queues are bounded:
+    a slow stage holds back the one before it instead of piling up pages.
+    Rows are written in the order pages come out of the rasterizers.
+    :param pdf_folder: Folder holding the PDF files.
+    :param img_folder: Folder that receives one sub-folder of pages per PDF.
+    :param output_csv: CSV file the cleaned rows are appended to.
+    :param flush_size: Number of rows buffered before they are written out.
+    :param ocr_workers: Number of processes OCRing pages.
+    :param raster_workers: Number of PDFs rasterized at the same time.
+    :param queue_size: Capacity of each queue between two stages.
+    :param ocr_mode: 'crops', 'layout' or 'compare' (see process_page).
+    :param manifest: Optional Manifest; finished PDFs and pages are skipped and recorded.
+    :param report_path: Write the METRICS run report here.
+    :param profile_every: cProfile every Nth page of each OCR process into profile_dir (0 = off).
+    :param profile_dir: Folder for the page profiles.
+    :param raster_options: Keyword arguments passed on to rasterize_pdf.
+    :param writers: Additional outputs for the cleaned rows (see CsvResultSink).
+    """
+    started = time.perf_counter()
+    done = object()
+    pdf_paths = queue.Queue()
+    for filename in sorted(os.listdir(pdf_folder)):
+        if filename.endswith('.pdf'):
+            pdf_paths.put(os.path.join(pdf_folder, filename))
+    page_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    page_hashes = {}
+    errors = []
+
+    def rasterize():
+        try:
+            while True:
+                try:
+                    pdf_path = pdf_paths.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    stats = rasterize_pdf(pdf_path, img_folder, manifest=manifest, on_page=page_queue.put, **(raster_options or {}))
+                    if stats is None:
+                        # Rasterized in an earlier run; its pages may still need OCR
+                        folder = os.path.join(img_folder, os.path.splitext(os.path.basename(pdf_path))[0])
+                        for page_file in iter_pdf_page_files(folder):
+                            page_queue.put(page_file)
+                except Exception as e:
+                    METRICS.incr('pdfs_failed')
+                    print(f"Skipping {os.path.basename(pdf_path)}: {e}")
+        finally:
+            page_queue.put(done)
+
+    def write():
+        first_row = True
+        while True:
+            future = result_queue.get()
+            if future is done:
+                return
+            if errors:
+                continue  # Keep draining so the submitting thread never blocks
+            try:
+                result = future.result()
+                with METRICS.timer('pipeline_write'):
+                    write_results([result], sink, page_hashes)
+            except Exception as e:
+                errors.append(e)
+            if first_row:
+                METRICS.observe('first_row', time.perf_counter() - started)
+                first_row = False
+
+    process = partial(_process_page_safe, ocr_mode=ocr_mode, drain_metrics=True,
+                      profile_every=profile_every, profile_dir=profile_dir)
+    sink = CsvResultSink(output_csv, flush_size=flush_size,
+                         on_flush=manifest.mark_pages if manifest is not None else None, writers=writers)
+    # Forked before the rasterizer and writer threads start
+    executor = _worker_pool(ocr_workers)
+    rasterizers = [threading.Thread(target=rasterize, name=f'pipeline-raster-{i}', daemon=True)
+                   for i in range(max(1, raster_workers))]
+    writer = threading.Thread(target=write, name='pipeline-writer')
+    writer.start()
+    for thread in rasterizers:
+        thread.start()
+
+    try:
+        finished = 0
+        while finished < len(rasterizers) and not errors:
+            page_file = page_queue.get()
+            if page_file is done:
+                finished += 1
+                continue
+            if manifest is not None:
+                page_hashes[page_file] = file_sha256(page_file)
+                if manifest.page_done(page_file, page_hashes[page_file]):
+                    continue
+            result_queue.put(executor.submit(process, page_file))
+    finally:
+        result_queue.put(done)
+        writer.join()
+        executor.shutdown(cancel_futures=True)
+        sink.close()
+    if errors:
+        raise errors[0]
+
+    report = METRICS.report()['stages']
+    busy = {stage: report[stage]['total_s'] for stage in ['rasterize', 'page', 'pipeline_write'] if stage in report}
+    print(f"Pipeline finished in {time.perf_counter() - started:.1f}s; stage time: "
+          + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in busy.items()))
+    finish_run(report_path)
+
+
+class LeaseDirectory:
+    """
+    Expiring claims on work items, held as lease files in a folder shared by
+    every worker (local disk or a network filesystem).
+
+    A lease is taken by creating <item>.lease with O_CREAT | O_EXCL, which only
+    one worker can win, and kept alive by touching it (renew). A lease whose file
+    has not been touched for `timeout` seconds belongs to a crashed worker and is
+    reclaimed: the workers that notice race to create a marker file for that
+    exact lease, and only the winner deletes it, so a fresh lease is never removed.
+    A marker older than `timeout` was left by a worker that died while
+    reclaiming, and is removed so the item does not stay stuck.
+    """
+
+    def __init__(self, folder, owner, timeout=DEFAULT_LEASE_TIMEOUT):
+        """
+        :param folder: Lease folder; created if missing.
+        :param owner: Name of this worker, recorded in its leases.
+        :param timeout: Seconds without renewal after which a lease is stale.
+        """
+        self.folder = folder
+        self.owner = owner
+        self.timeout = timeout
+        self.tokens = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.folder, name + '.lease')
+
+    def _read(self, path):
+        """
+        :return: Tuple of (lease record or None if unreadable, mtime), or None if there is no lease.
+        """
+        try:
+            # mtime and contents from the same open file: the lease may be replaced in between two lookups by path
+            with open(path, encoding='utf-8') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            return json.loads(text), mtime
+        except ValueError:
+            return None, mtime  # Being written, or left empty by a crash
+
+    def claim(self, name):
+        """
+        Try to take the lease on an item.
+        :return: True if this worker now holds it.
+        """
+        path = self._path(name)
+        # Retried after removing a stale lease, and after an abandoned reclaim marker before that
+        for _attempt in range(3):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._reclaim(path):
+                    return False
+                continue
+            token = uuid.uuid4().hex
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'owner': self.owner, 'host': socket.gethostname(), 'pid': os.getpid(),
+                           'token': token, 'claimed': time.time()}, f)
+            self.tokens[name] = token
+            return True
+        return False
+
+    def _reclaim(self, path):
+        """
+        Remove a stale lease so it can be claimed again.
+        :return: True if the lease is gone (claiming may be retried).
+        """
+        lease = self._read(path)
+        if lease is None:
+            return True
+        record, mtime = lease
+        if time.time() - mtime < self.timeout:
+            return False
+        token = record.get('token') if record else None
+        marker = f"{path}.{token or 'unreadable'}.reclaim"
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # Another worker is reclaiming this lease, or died doing so
+            try:
+                stale = time.time() - os.path.getmtime(marker) >= self.timeout
+            except FileNotFoundError:
+                return True  # That worker is done; claiming may be retried
+            if not stale:
+                return False
+            try:
+                os.remove(marker)
+            except FileNotFoundError:
+                pass
+            METRICS.incr('reclaims_abandoned')
+            print(f"Removed abandoned reclaim marker {os.path.basename(marker)}")
+            return True
+        try:
+            current = self._read(path)
+            if current is not None and (current[0] or {}).get('token') == token:
+                os.remove(path)
+                METRICS.incr('leases_reclaimed')
+                print(f"Reclaimed stale lease {os.path.basename(path)} of {(record or {}).get('owner', 'unknown worker')}")
+            return True
+        finally:
+            os.remove(marker)
+
+    def holds(self, name):
+        """
+        :return: True if the lease file on the item is still this worker's.
+        """
+        lease = self._read(self._path(name))
+        return lease is not None and (lease[0] or {}).get('token') == self.tokens.get(name)
+
+    def renew(self, name):
+        """
+        Heartbeat: push back the expiry of a lease this worker holds.
+        :return: False if the lease was lost (reclaimed by another worker).
+        """
+        if not self.holds(name):
+            return False
+        os.utime(self._path(name))
+        return True
+
+    def release(self, name):
+        """
+        Give up a lease, if it is still this worker's.
+        """
+        if self.holds(name):
+            os.remove(self._path(name))
+        self.tokens.pop(name, None)
+
+
+def shard_folders(root):
+    """
+    Layout of a sharded batch under a shared root folder.
+    :return: Dictionary of role to folder: 'pdf' (input PDFs), 'leases', 'done'
+        (one marker per finished PDF), 'shards' (one CSV per worker) and 'work'
+        (per-worker pages).
+    """
+    return {role: os.path.join(root, name) for role, name in
+            [('pdf', 'PDF'), ('leases', 'leases'), ('done', 'done'), ('shards', 'shards'), ('work', 'work')]}
+
+
+def _keep_lease(leases, name, stop):
+    # Heartbeat thread: renew the lease until the PDF is finished
+    while not stop.wait(leases.timeout / 3):
+        if not leases.renew(name):
+            print(f"Lost the lease on {name}; another worker may process it too")
+            return
+
+
+def shard_worker(root, worker_id=None, ocr_mode='crops', lease_timeout=DEFAULT_LEASE_TIMEOUT,
+                 poll_interval=DEFAULT_SHARD_POLL, raster_options=None, report_path=None):
+    """
+    Process the PDFs of a shared folder together with other workers, on this or other hosts.
+    The worker claims one PDF at a time through a LeaseDirectory, writes its rows
+    (tagged with STATION) to its own shard CSV and marks the PDF done. It returns
+    once every PDF is done, waiting for PDFs other workers hold and taking over
+    those whose lease expires. A PDF processed twice after a lost lease yields the
+    same records, which merge_shards folds together. The shard's RecordStore is
+    kept on local disk, since SQLite's WAL mode does not work on network
+    filesystems; a worker restarted elsewhere rebuilds it from the shard CSV.
+    :param root: Shared folder (see shard_folders).
+    :param worker_id: Unique name of this worker; defaults to host name and pid.
+    :param ocr_mode: 'crops', 'layout' or 'compare' (see process_page).
+    :param lease_timeout: Seconds after which the lease of a silent worker expires.
+    :param poll_interval: Seconds to wait when every remaining PDF is held by other workers.
+    :param raster_options: Keyword arguments passed on to rasterize_pdf.
+    :param report_path: Write this worker's METRICS run report here.
+    :return: Number of PDFs this worker processed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    folders = shard_folders(root)
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+    leases = LeaseDirectory(folders['leases'], worker_id, lease_timeout)
+    process = partial(_process_page_safe, ocr_mode=ocr_mode)
+    shard_csv = os.path.join(folders['shards'], f"{worker_id}.csv")
+    index_name = f"shard-{worker_id}-{hashlib.sha1(os.path.abspath(shard_csv).encode('utf-8')).hexdigest()[:12]}.index.sqlite"
+    sink = CsvResultSink(shard_csv, index_path=os.path.join(tempfile.gettempdir(), index_name))
+    img_folder = os.path.join(folders['work'], worker_id)
+    processed = 0
+
+    def done_path(filename):
+        return os.path.join(folders['done'], filename + '.json')
+
+    try:
+        while True:
+            pending = [f for f in sorted(os.listdir(folders['pdf'])) if f.endswith('.pdf') and not os.path.exists(done_path(f))]
+            if not pending:
+                break
+            claimed = False
+            for filename in pending:
+                if not leases.claim(filename):
+                    continue
+                if os.path.exists(done_path(filename)):
+                    # Finished by another worker since the listing
+                    leases.release(filename)
+                    continue
+                claimed = True
+                stop = threading.Event()
+                keeper = threading.Thread(target=_keep_lease, args=(leases, filename, stop), daemon=True)
+                keeper.start()
+                started = time.perf_counter()
+                record = {'worker': worker_id, 'station': STATION}
+                try:
+                    pdf_path = os.path.join(folders['pdf'], filename)
+                    rasterize_pdf(pdf_path, img_folder, **(raster_options or {}))
+                    pdf_img_folder = os.path.join(img_folder, os.path.splitext(filename)[0])
+                    write_results(map(process, iter_pdf_page_files(pdf_img_folder)), sink)
+                    record['rows'] = sink.flush()
+                    shutil.rmtree(pdf_img_folder, ignore_errors=True)
+                    METRICS.incr('shard_pdfs')
+                    processed += 1
+                except Exception as e:
+                    # Marked done with the error so the other workers do not retry it forever
+                    METRICS.incr('pdfs_failed')
+                    record['error'] = str(e)
+                    print(f"Skipping {filename}: {e}")
+                finally:
+                    stop.set()
+                    keeper.join()
+                record['seconds'] = round(time.perf_counter() - started, 3)
+                with open(done_path(filename) + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(record, f)
+                os.replace(done_path(filename) + '.tmp', done_path(filename))
+                leases.release(filename)
+            if not claimed:
+                # Everything left is held by other workers: wait for them to finish or expire
+                time.sleep(poll_interval)
+    finally:
+        sink.close()
+        finish_run(report_path)
+    print(f"Worker {worker_id} done: {processed} PDF(s)")
+    return processed
+
+
+def _shard_worker_metrics(*args, **kwargs):
+    # Pool task: run a shard worker and hand its metrics back to the parent
+    shard_worker(*args, **kwargs)
+    return METRICS.drain()
+
+
+def run_shards(root, workers=2, ocr_mode='crops', lease_timeout=DEFAULT_LEASE_TIMEOUT, raster_options=None, output_csv=OUTPUT_CSV,
+               writers=(), report_path=None):
+    """
+    Run several shard workers on this machine against a shared folder, then merge their shards.
+    :param root: Shared folder (see shard_folders).
+    :param workers: Number of worker processes.
+    :param output_csv: CSV the shards are merged into.
+    :param writers: Additional outputs for the merged rows (see CsvResultSink).
+    :param report_path: Write the METRICS run report of all the workers and the merge here.
+    :return: Number of rows merge_shards appended.
+    """
+    host = socket.gethostname()
+    with _worker_pool(workers) as executor:
+        futures = [executor.submit(_shard_worker_metrics, root, f"{host}-{i}", ocr_mode, lease_timeout, DEFAULT_SHARD_POLL,
+                                   raster_options)
+                   for i in range(workers)]
+        for future in futures:
+            METRICS.merge(future.result())
+    appended = merge_shards(root, output_csv, writers)
+    finish_run(report_path)
+    return appended
+
+
+def merge_shards(root, output_csv=OUTPUT_CSV, writers=()):
+    """
+    Combine the shard CSVs of every worker into the final dataset. Rows go
+    through the output's RecordStore, so records found by several workers (or
+    already in the CSV) are merged rather than duplicated; merging twice is harmless.
+    :param root: Shared folder (see shard_folders).
+    :param output_csv: Final CSV.
+    :param writers: Additional outputs for the merged rows (see CsvResultSink).
+    :return: Number of rows appended to output_csv.
+    """
+    sink = CsvResultSink(output_csv, writers=writers)
+    appended = 0
+    try:
+        for path in sorted(glob.glob(os.path.join(shard_folders(root)['shards'], '*.csv'))):
+            shard = pd.read_csv(path, dtype=str, keep_default_na=False)
+            with METRICS.timer('merge_shard'):
+                appended += sink.append_cleaned(shard.reindex(columns=sink.columns, fill_value=''))
+            print(f"Merged {path}: {len(shard)} row(s)")
+    finally:
+        sink.close()
+    print(f"Merged shards into {output_csv}: {appended} new row(s)")
+    return appended
+
+
+def pending_pages(page_files, manifest=None):
+    """
+    Drop the pages a manifest lists as done.
+    :param page_files: Page file paths.
+    :param manifest: Optional Manifest.
+    :return: Tuple of (pages still to process, dictionary of page path to content
+        hash; empty without a manifest).
+    """
+    if manifest is None:
+        return page_files, {}
+    page_hashes = {file_path: file_sha256(file_path) for file_path in page_files}
+    remaining = [f for f in page_files if not manifest.page_done(f, page_hashes[f])]
+    print(f"Resuming: {len(page_files) - len(remaining)} page(s) already done, {len(remaining)} to go")
+    return remaining, page_hashes
+
+
+def write_results(results, sink, page_hashes=None):
+    """
+    Hand the results of _process_page_safe to a sink, in order.
+    :param results: Iterable of _process_page_safe results.
+    :param sink: CsvResultSink receiving the rows.
+    :param page_hashes: Optional page content hashes; pages listed here are tagged
+        with (path, hash) for the sink's on_flush callback.
+    """
+    page_hashes = page_hashes or {}
+    for file_path, extracted_data, error, page_metrics in results:
+        if page_metrics is not None:
+            METRICS.merge(page_metrics)
+        if error:
+            print(f"Skipping {file_path}: {error}")
+            continue
+        if extracted_data is None:
+            continue  # Not a coversheet (page triage)
+        tag = (file_path, page_hashes[file_path]) if file_path in page_hashes else None
+        sink.add(extracted_data, tag)
+
+
+def finish_run(report_path=None):
+    """
+    Print the OCR cache statistics and write the run report.
+    """
+    if OCR_CACHE is not None:
+        OCR_CACHE.flush()
+        print(f"OCR cache: {METRICS.counters.get('ocr_cache_hits', 0)} hit(s), "
+              f"{METRICS.counters.get('ocr_cache_misses', 0)} miss(es)")
+    if report_path:
+        METRICS.write_report(report_path)
+
+
+def move_to(path, folder):
+    """
+    Move a file or folder into another folder, replacing an earlier copy of the same name.
+    :param path: File or folder to move.
+    :param folder: Destination folder; created if missing.
+    """
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(os.path.normpath(path)))
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    shutil.move(path, target)
+
+
+class FolderWatcher(threading.Thread):
+    """
+    Watch a folder for new PDFs and queue each one once it has stopped changing.
+
+    The folder is rescanned every poll_interval seconds; with inotify_simple
+    installed, file events wake the scan up at once instead. A file is queued
+    when its size and modification time stay the same for settle_seconds, so
+    PDFs still being copied in are not read half-written. When the queue is full
+    the watcher blocks and new files wait on disk (backpressure).
+    """
+
+    def __init__(self, folder, pdf_queue, stop, poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        """
+        :param folder: Folder to watch.
+        :param pdf_queue: Bounded queue.Queue receiving (pdf path, time first seen).
+        :param stop: threading.Event ending the watch.
+        """
+        super().__init__(name='folder-watcher', daemon=True)
+        self.folder = folder
+        self.queue = pdf_queue
+        self.stop = stop
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.queued = set()
+        # Path -> ((size, mtime), time that signature was first seen, time the file was first seen)
+        self.pending = {}
+
+    def _open_inotify(self):
+        if inotify_simple is None:
+            return None
+        try:
+            inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            inotify.add_watch(self.folder, flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO)
+            return inotify
+        except OSError as e:
+            print(f"Warning: inotify unavailable, polling {self.folder}: {e}")
+            return None
+
+    def run(self):
+        os.makedirs(self.folder, exist_ok=True)
+        inotify = self._open_inotify()
+        try:
+            while not self.stop.is_set():
+                self.scan()
+                timeout = min(self.poll_interval, self.settle_seconds) if self.pending else self.poll_interval
+                if inotify is not None:
+                    inotify.read(timeout=int(timeout * 1000))
+                else:
+                    self.stop.wait(timeout)
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def scan(self):
+        """
+        Queue the PDFs of the folder that are new and no longer changing.
+        """
+        paths = {os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith('.pdf')}
+        # A file moved away after processing is picked up again if it comes back
+        self.queued &= paths
+        for path in list(self.pending):
+            if path not in paths:
+                del self.pending[path]
+
+        now = time.time()
+        for path in sorted(paths - self.queued):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            previous = self.pending.get(path)
+            if previous is None or previous[0] != signature:
+                self.pending[path] = (signature, now, previous[2] if previous else now)
+                continue
+            if stat.st_size == 0 or now - previous[1] < self.settle_seconds:
+                continue
+            if not self._put((path, previous[2])):
+                return
+            del self.pending[path]
+            self.queued.add(path)
+
+    def _put(self, item):
+        # Blocks while the pipeline is busy; gives up only when stopping
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+def watch(pdf_folder='PDF', img_folder='IMG', done_pdf_folder='PDFr', done_img_folder='IMGr', output_csv=OUTPUT_CSV,
+          workers=1, ocr_mode='crops', manifest=None, report_path=None, queue_size=DEFAULT_QUEUE_SIZE,
+          poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS, raster_options=None, writers=()):
+    """
+    Service mode: process PDFs continuously as they are dropped into pdf_folder.
+    Each PDF is rasterized, OCRed and parsed, its rows are appended to the CSV at
+    once, and the PDF and its pages are moved to done_pdf_folder / done_img_folder.
+    Runs until SIGINT or SIGTERM; the PDF in progress is finished and the CSV
+    closed before returning, and PDFs still queued stay in pdf_folder for the next start.
+    A PDF that fails at any step stays in pdf_folder too, and the service goes on
+    with the next one (with a new worker pool if a worker died).
+    :param pdf_folder: Folder watched for new PDFs.
+    :param img_folder: Folder receiving the pages while a PDF is processed.
+    :param done_pdf_folder: Folder finished PDFs are moved to.
+    :param done_img_folder: Folder the pages of finished PDFs are moved to.
+    :param output_csv: CSV file the cleaned rows are appended to.
+    :param workers: Number of processes OCRing the pages of a PDF.
+    :param ocr_mode: 'crops', 'layout' or 'compare' (see process_page).
+    :param manifest: Optional Manifest recording finished PDFs and pages.
+    :param report_path: Write the METRICS run report here on shutdown.
+    :param queue_size: Maximum number of PDFs waiting to be processed.
+    :param poll_interval: Seconds between folder scans.
+    :param settle_seconds: Seconds a file must stay unchanged before it is processed.
+    :param raster_options: Keyword arguments passed on to rasterize_pdf.
+    :param writers: Additional outputs for the cleaned rows (see CsvResultSink).
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, stopping after the current PDF")
+        stop.set()
+
+    previous_handlers = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    pdf_queue = queue.Queue(maxsize=queue_size)
+    watcher = FolderWatcher(pdf_folder, pdf_queue, stop, poll_interval, settle_seconds)
+    process = partial(_process_page_safe, ocr_mode=ocr_mode, drain_metrics=workers > 1)
+    executor = None
+    if workers > 1:
+        executor = _worker_pool(workers)
+    sink = CsvResultSink(output_csv, on_flush=manifest.mark_pages if manifest is not None else None, writers=writers)
+    watcher.start()
+    print(f"Watching {pdf_folder} ({'inotify' if inotify_simple is not None else 'polling'}); Ctrl+C to stop")
+    try:
+        while not stop.is_set():
+            try:
+                pdf_path, first_seen = pdf_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            filename = os.path.basename(pdf_path)
+            try:
+                rasterize_pdf(pdf_path, img_folder, manifest=manifest, **(raster_options or {}))
+            except Exception as e:
+                # Left in place; it is retried on the next start
+                METRICS.incr('pdfs_failed')
+                print(f"Skipping {filename}: {e}")
+                continue
+            pdf_img_folder = os.path.join(img_folder, os.path.splitext(filename)[0])
+            try:
+                page_files, page_hashes = pending_pages(list(iter_pdf_page_files(pdf_img_folder)), manifest)
+                results = executor.map(process, page_files) if executor is not None else map(process, page_files)
+                write_results(results, sink, page_hashes)
+                # Rows of this PDF, merged ones included, reach the CSV before it is moved out of the queue folder
+                sink.flush()
+                sink.sync()
+            except Exception as e:
+                # Left in place like a PDF that failed to rasterize (e.g. a worker died or the CSV is locked)
+                METRICS.incr('pdfs_failed')
+                print(f"Skipping {filename}: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    executor.shutdown(cancel_futures=True)
+                    executor = _worker_pool(workers)
+                continue
+            move_to(pdf_path, done_pdf_folder)
+            move_to(pdf_img_folder, done_img_folder)
+            METRICS.incr('pdfs_watched')
+            METRICS.observe('file_latency', time.time() - first_seen)
+            print(f"Done {filename} in {time.time() - first_seen:.1f}s after it arrived")
+    finally:
+        stop.set()
+        watcher.join()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        sink.close()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        finish_run(report_path)
+
+
+def main2(image_path, raw_text=None):
+    """
+    Main function to process the image and extract data points.
+    :param image_path: Path to the image file, or the cropped PIL image.
+    :param raw_text: Text already read for the region (layout OCR); skips the OCR call.
     """
     # Extract text from the image
-    raw_text = extract_text_from_image(image_path)
+    if raw_text is None:
+        raw_text = extract_text_from_image(image_path)
     if raw_text.startswith("Error:"):
         print(raw_text)
         return
@@ -437,13 +3072,15 @@ def main2(image_path):
     extracted_data = extract_data_using_patterns(formatted_text, patterns)
     return extracted_data
 
-def main3(image_path):
+def main3(image_path, raw_text=None):
     """
     Main function to process the image and extract data points.
-    :param image_path: Path to the image file.
+    :param image_path: Path to the image file, or the cropped PIL image.
+    :param raw_text: Text already read for the region (layout OCR); skips the OCR call.
     """
     # Extract text from the image
-    raw_text = extract_text_from_image(image_path)
+    if raw_text is None:
+        raw_text = extract_text_from_image(image_path)
     if raw_text.startswith("Error:"):
         print(raw_text)
         return
@@ -466,15 +3103,17 @@ def main3(image_path):
 
 
 
-def main6(text, image_path):
+def main6(text, image_path, raw_text=None):
     """
     Main function to process the image and extract data points.
     :param text: Key for the extracted data.
-    :param image_path: Path to the image file.
+    :param image_path: Path to the image file, or the cropped PIL image.
+    :param raw_text: Text already read for the region (layout OCR); skips the OCR call.
     :return: Dictionary with extracted data or default value if an error occurs.
     """
     # Extract text from the image
-    raw_text = extract_text_from_image(image_path)
+    if raw_text is None:
+        raw_text = extract_text_from_image(image_path)
     
     # Check for errors in text extraction
     if not raw_text or raw_text.startswith("Error:"):
@@ -496,12 +3135,105 @@ def main6(text, image_path):
     return extracted_data
 
 # Run the main function
-if __name__ == "__main__":    
-    save_images('PDF')
-    main('IMG')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract coversheet time charts from PDFs into the master CSV.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes OCRing pages in parallel.")
+    parser.add_argument('--ocr-mode', choices=['crops', 'layout', 'compare'], default='crops',
+                        help="OCR every header region separately (crops), read all fields from one "
+                             "word-box OCR pass per page (layout), or run both and report differences (compare).")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI, help="PDF rendering resolution.")
+    parser.add_argument('--grayscale', action='store_true', help="Rasterize pages in grayscale.")
+    parser.add_argument('--binarize', type=int, metavar='LEVEL',
+                        help="Save pages as black and white, thresholded at this grey level (0-255).")
+    parser.add_argument('--header-dpi', type=int,
+                        help="Render the header band separately at this resolution when --dpi is lower.")
+    parser.add_argument('--raster-threads', type=int, default=1, help="Number of poppler threads.")
+    parser.add_argument('--no-text-layer', action='store_true',
+                        help="Rasterize and OCR every PDF page, even pages with an embedded text layer.")
+    parser.add_argument('--raster-chunk', type=int, default=DEFAULT_RASTER_CHUNK, help="PDF pages held in memory at once.")
+    parser.add_argument('--ocr-backend', choices=sorted(OCR_BACKENDS), default='pytesseract',
+                        help="OCR engine: pytesseract (one tesseract process per call) or tesserocr "
+                             "(engine kept loaded in each worker).")
+    parser.add_argument('--tesseract-cmd', default=DEFAULT_TESSERACT_CMD,
+                        help="Path of the tesseract binary (default: $TESSERACT_CMD or the standard location).")
+    parser.add_argument('--triage', type=float, nargs='?', const=DEFAULT_TRIAGE_THRESHOLD, metavar='INK',
+                        help="Skip pages whose thumbnail has less than this fraction of ink on the page or in the "
+                             f"header band before OCRing them (default when given without a value: {DEFAULT_TRIAGE_THRESHOLD}).")
+    parser.add_argument('--ocr-cache', help="SQLite file caching OCR results between runs (disabled if omitted).")
+    parser.add_argument('--ocr-cache-mb', type=float, default=DEFAULT_OCR_CACHE_MB, help="Size limit of the OCR cache.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip PDFs and pages the manifest lists as done and record progress as pages are written.")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help="Manifest file used by --resume.")
+    parser.add_argument('--report', help="Write a per-run metrics report (JSON, or Prometheus text for a .prom file).")
+    parser.add_argument('--profile-every', type=int, default=0, help="cProfile every Nth page (0 = off).")
+    parser.add_argument('--profile-dir', default='profiles', help="Folder for the page profiles.")
+    parser.add_argument('--parquet', metavar='DIR',
+                        help="Also write the results as a Parquet dataset partitioned by station and date (needs pyarrow).")
+    parser.add_argument('--compact-parquet', metavar='DIR',
+                        help="Merge the small files of each partition of a Parquet dataset, keeping the latest version of merged records, then exit.")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Run rasterization, OCR and CSV writing as concurrent stages instead of one after the other.")
+    parser.add_argument('--raster-workers', type=int, default=1, help="PDFs rasterized at the same time in --pipeline mode.")
+    parser.add_argument('--pipeline-queue', type=int, default=DEFAULT_PIPELINE_QUEUE,
+                        help="Pages held between two stages in --pipeline mode.")
+    parser.add_argument('--station', default=DEFAULT_STATION, help="Station written into every row.")
+    parser.add_argument('--shard-root', metavar='DIR',
+                        help="Sharded batch: process the PDFs in DIR/PDF together with other workers sharing DIR.")
+    parser.add_argument('--worker-id', help="Unique name of this shard worker (default: host name and pid).")
+    parser.add_argument('--shard-workers', type=int, default=0,
+                        help="Start this many shard workers on this machine and merge their shards when they finish.")
+    parser.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT,
+                        help="Seconds after which the PDF of a silent shard worker is taken over.")
+    parser.add_argument('--merge-shards', metavar='DIR', help="Merge the shard CSVs under DIR into the output CSV, then exit.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Run as a service: process PDFs as they arrive in the PDF folder until stopped.")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="PDFs queued ahead of the pipeline in --watch mode.")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between folder scans in --watch mode.")
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Seconds a new PDF must stay unchanged before --watch picks it up.")
+    parser.add_argument('--flush-size', type=int, default=DEFAULT_FLUSH_SIZE, help="Rows buffered before appending to the CSV.")
+    args = parser.parse_args()
+
+    if args.compact_parquet:
+        ParquetDataset(args.compact_parquet).compact()
+        sys.exit(0)
+
+    configure_ocr_backend(args.ocr_backend, args.tesseract_cmd)
+    configure_ocr_cache(args.ocr_cache, args.ocr_cache_mb)
+    configure_triage(args.triage)
+    configure_station(args.station)
+    manifest = Manifest(args.manifest) if args.resume else None
+    raster_options = dict(dpi=args.dpi, grayscale=args.grayscale, thread_count=args.raster_threads, chunk_size=args.raster_chunk,
+                          text_layer=not args.no_text_layer, threshold=args.binarize, header_dpi=args.header_dpi)
+    writers = [ParquetDataset(args.parquet)] if args.parquet else []
+    if args.merge_shards:
+        merge_shards(args.merge_shards, writers=writers)
+        sys.exit(0)
+    if args.shard_root:
+        if args.shard_workers:
+            run_shards(args.shard_root, args.shard_workers, args.ocr_mode, args.lease_timeout, raster_options,
+                       writers=writers, report_path=args.report)
+        else:
+            shard_worker(args.shard_root, args.worker_id, args.ocr_mode, args.lease_timeout,
+                         raster_options=raster_options, report_path=args.report)
+        sys.exit(0)
+    if args.watch:
+        watch('PDF', 'IMG', 'PDFr', 'IMGr', workers=args.workers, ocr_mode=args.ocr_mode, manifest=manifest,
+              report_path=args.report, queue_size=args.queue_size, poll_interval=args.poll_interval,
+              settle_seconds=args.settle_seconds, raster_options=raster_options, writers=writers)
+        sys.exit(0)
+
+    if args.pipeline:
+        pipeline('PDF', 'IMG', flush_size=args.flush_size, ocr_workers=args.workers, raster_workers=args.raster_workers,
+                 queue_size=args.pipeline_queue, ocr_mode=args.ocr_mode, manifest=manifest, report_path=args.report,
+                 profile_every=args.profile_every, profile_dir=args.profile_dir, raster_options=raster_options, writers=writers)
+    else:
+        save_images('PDF', manifest=manifest, **raster_options)
+        main('IMG', flush_size=args.flush_size, workers=args.workers, ocr_mode=args.ocr_mode, manifest=manifest,
+             report_path=args.report, profile_every=args.profile_every, profile_dir=args.profile_dir, writers=writers)
 
     for filename in os.listdir('PDF'):
-        shutil.move(f'PDF\\{filename}', 'PDFr')
-    
+        move_to(os.path.join('PDF', filename), 'PDFr')
+
     for filename in os.listdir('IMG'):
-        shutil.move(f'IMG\\{filename}', 'IMGr')
+        move_to(os.path.join('IMG', filename), 'IMGr')
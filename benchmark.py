@@ -0,0 +1,465 @@
+"""
+Reproducible throughput benchmark for the coversheet pipeline in Server.py.
+
+Synthetic coversheet pages are rendered with PIL in the layout HEADER_REGIONS and
+TIME_CHART_LABELS expect, and synthetic DataFrames of raw extracted values are
+generated for the cleaners. Each stage reports latency percentiles, throughput
+and the peak RSS sampled while it ran; the results are saved as JSON so runs
+can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Everything runs offline. The rasterization and OCR stages need poppler and
+tesseract on the PATH and are skipped (and reported as such) without them.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFont
+
+import Server
+
+# Seconds between two resident memory samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.005
+
+# Page size of a letter-sized coversheet rendered at Server.DEFAULT_DPI
+PAGE_SIZE = (1700, 2200)
+
+AIRLINES = ['SV', 'XY', 'F3', 'D3', 'MS', 'EK']
+AIRPORTS = ['RUH', 'JED', 'DMM', 'MED', 'AHB', 'CAI', 'DXB']
+AC_TYPES = ['A320', 'A321', 'A330', 'B777', 'B787']
+NAMES = ['Ahmed', 'Sara', 'Khalid', 'Noura', 'Fahad', 'Huda']
+
+
+def _font(size):
+    """
+    Scalable default font when Pillow has FreeType, the bitmap default otherwise.
+    """
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _time(rnd, base_minutes):
+    minutes = (base_minutes + rnd.randint(0, 20)) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def synthetic_page_fields(rnd):
+    """
+    Random but valid field values for one coversheet.
+    :param rnd: random.Random instance.
+    :return: Dictionary of header values and time-chart lines.
+    """
+    base = rnd.randint(0, 20 * 60)
+    airline = rnd.choice(AIRLINES)
+    number = rnd.randint(100, 999)
+    fields = {
+        'Date': f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.2024",
+        'ARR': f"{rnd.randint(10000000, 99999999)}/{rnd.choice('ABC')}. {rnd.choice(NAMES)}",
+        'DEP': f"{rnd.randint(10000000, 99999999)}/{rnd.choice('ABC')}. {rnd.choice(NAMES)}",
+        'Flight Arrival': f"{airline} {number}",
+        'Flight Departure': f"{airline} {number + 1}",
+        'From': rnd.choice(AIRPORTS),
+        'To': rnd.choice(AIRPORTS),
+        'AC Type:': rnd.choice(AC_TYPES),
+    }
+    lines = [f"Date: {fields['Date']}"]
+    for label, _start_keys, finish_key, _mode in Server.TIME_CHART_LABELS:
+        base += rnd.randint(1, 10)
+        times = [_time(rnd, base)]
+        if finish_key:
+            times.append(_time(rnd, base + 25))
+        lines.append(f"{label} {' '.join(times)}")
+    fields['lines'] = lines
+    return fields
+
+
+def render_coversheet(fields):
+    """
+    Draw a coversheet page: header values inside their HEADER_REGIONS boxes and
+    the time chart below them, one label per line.
+    :param fields: Output of synthetic_page_fields.
+    :return: PIL image of PAGE_SIZE.
+    """
+    img = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(img)
+    header_font = _font(20)
+    for name, (left, top, _right, _bottom) in Server.HEADER_REGIONS.items():
+        draw.text((left + 6, top + 8), fields[name], fill='black', font=header_font)
+
+    chart_font = _font(30)
+    y = 380
+    for line in fields['lines']:
+        draw.text((120, y), line, fill='black', font=chart_font)
+        y += 52
+    return img
+
+
+def synthetic_page_text(fields):
+    """
+    The text tesseract would return for a rendered page, for OCR-free parsing benchmarks.
+    """
+    return "\n".join(fields['lines'])
+
+
+def make_synthetic_pdfs(pdf_folder, pdf_count, pages_per_pdf, seed):
+    """
+    Write multi-page synthetic coversheet PDFs (and keep their page images).
+    :return: List of rendered PIL pages.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(pdf_folder, exist_ok=True)
+    pages = []
+    for pdf_index in range(pdf_count):
+        images = [render_coversheet(synthetic_page_fields(rnd)) for _ in range(pages_per_pdf)]
+        images[0].save(os.path.join(pdf_folder, f"synthetic_{pdf_index + 1}.pdf"), 'PDF',
+                       resolution=Server.DEFAULT_DPI, save_all=True, append_images=images[1:])
+        pages.extend(images)
+    return pages
+
+
+def synthetic_frame(n_rows, seed):
+    """
+    DataFrame of raw extracted values (valid, malformed and missing) in the CSV layout.
+    :param n_rows: Number of rows.
+    :param seed: Random seed.
+    :return: DataFrame with Server.CSV_COLUMNS.
+    """
+    rng = np.random.default_rng(seed)
+
+    def pick(choices):
+        return rng.choice(np.array(choices, dtype=object), size=n_rows)
+
+    times = [f"{h:02d}:{m:02d}" for h in range(0, 24, 3) for m in (0, 15, 45)]
+    frame = {
+        'Date': pick(['01.02.2024', '12/31/2023', 'Not found', '', '5.6.2024', 'garbage', None]),
+        'Station': pick(['RUH']),
+        'Flight Arrival': pick(['SV 123', 'SV123', 'd3169', 'S 12', 'Not found', None]),
+        'Flight Departure': pick(['SV 124', 'XY9', 'SV-1', 'Not found']),
+        'AC Type:': pick(['A320 From:', 'B777', 'To: A321', 'Not found']),
+        'From': pick(['RUH', 'jed', 'RU', 'Not found', None]),
+        'To': pick(['DMM', 'cai', 'ABCD', 'Not found']),
+        'ARR PRN': pick(['15029674', 'Not found']),
+        'ARR NAME': pick(['. J ..Ahmed', 'Sara', 'Not found']),
+        'DEP PRN': pick(['87654321', 'Not found']),
+        'DEP NAME': pick(['Noura', '..Fahad', 'Not found']),
+    }
+    for column in Server.TIME_COLUMNS:
+        frame[column] = pick(times + ['09:45 | ETA', '25:10', '9:5', 'Not found', None])
+    return pd.DataFrame(frame, columns=Server.CSV_COLUMNS)
+
+
+def summarize(samples, units=1):
+    """
+    Latency percentiles of a stage.
+    :param samples: Per-item durations in seconds.
+    :param units: Items processed per sample, for the throughput figure.
+    :return: Dictionary of count, total, mean, p50, p90, p99 (ms) and items_per_sec.
+    """
+    if not samples:
+        return {'count': 0}
+    values = np.array(samples) * 1000
+    total = float(np.sum(samples))
+    return {
+        'count': len(samples),
+        'total_s': round(total, 4),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'items_per_sec': round(len(samples) * units / total, 2) if total else None,
+    }
+
+
+def _rss():
+    peak = Server._peak_rss_mb()
+    return round(peak, 1) if peak is not None else None
+
+
+def sampled(function, *args):
+    """
+    Run a stage while a thread samples the resident memory of the process, and
+    add the highest sample to its report as peak_rss_mb. Unlike ru_maxrss this is
+    the peak of the stage itself, not of every stage that ran before it.
+    :param function: Stage function returning its report, or a tuple starting with it.
+    :return: What function returned.
+    """
+    peak = [Server._current_rss_mb()]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(RSS_SAMPLE_INTERVAL):
+            rss = Server._current_rss_mb()
+            if rss is not None:
+                peak[0] = max(peak[0] or 0, rss)
+
+    sampler = threading.Thread(target=sample, name='rss-sampler', daemon=True)
+    sampler.start()
+    try:
+        result = function(*args)
+    finally:
+        stop.set()
+        sampler.join()
+    report = result[0] if isinstance(result, tuple) else result
+    report['peak_rss_mb'] = round(peak[0], 1) if peak[0] is not None else None
+    return result
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def bench_rasterize(workdir, pdf_count, pages_per_pdf, seed):
+    if shutil.which('pdftoppm') is None:
+        return {'skipped': 'poppler (pdftoppm) not found'}, None
+    pdf_folder = os.path.join(workdir, 'PDF')
+    make_synthetic_pdfs(pdf_folder, pdf_count, pages_per_pdf, seed)
+    img_folder = os.path.join(workdir, 'IMG')
+    seconds, reports = _timed(Server.save_images, pdf_folder, img_folder)
+    pages = sum(report['pages'] for report in reports.values())
+    per_pdf = [report['seconds'] for report in reports.values()]
+    result = summarize(per_pdf, units=pages_per_pdf)
+    result['pages_per_sec'] = round(pages / seconds, 2) if seconds else None
+    return result, img_folder
+
+
+def bench_ocr(page_files):
+    if Server.tesseract_version() == "unknown":
+        return {'skipped': 'tesseract not found'}
+    samples = [_timed(Server.extract_text_from_image, path)[0] for path in page_files]
+    return summarize(samples)
+
+
+def bench_process_page(page_files, ocr_mode):
+    if Server.tesseract_version() == "unknown":
+        return {'skipped': 'tesseract not found'}
+    samples = [_timed(Server.process_page, path, ocr_mode)[0] for path in page_files]
+    result = summarize(samples)
+    result['pages_per_sec'] = result['items_per_sec']
+    return result
+
+
+def expected_fields(fields):
+    """
+    The values a perfect OCR pass would extract from a rendered page.
+    """
+    expected = Server.extract_time_chart(synthetic_page_text(fields))
+    expected['ARR PRN'] = fields['ARR'][:8]
+    expected['DEP PRN'] = fields['DEP'][:8]
+    for name in ['Flight Arrival', 'Flight Departure', 'From', 'To', 'AC Type:']:
+        expected[name] = fields[name]
+    return {key: value for key, value in expected.items() if value != "Not found"}
+
+
+def bench_preprocessing(page_count, seed, threshold, scale):
+    """
+    Field hit rate and OCR input size of full-resolution colour pages against
+    preprocessed pages (binarized, downscaled, header band kept at full resolution).
+    """
+    if Server.tesseract_version() == "unknown":
+        return {'skipped': 'tesseract not found'}
+    rnd = random.Random(seed)
+    pages = [synthetic_page_fields(rnd) for _ in range(page_count)]
+    variants = {
+        'baseline': lambda img: (img, None),
+        'preprocessed': lambda img: (
+            Server.preprocess_image(img, True, threshold, scale),
+            Server.preprocess_image(img.crop(Server.scale_box(Server.HEADER_BAND, Server.DEFAULT_DPI, img.width)),
+                                    True, threshold)),
+    }
+    results = {}
+    for name, prepare in variants.items():
+        hits = total = 0
+        pixels = Server.METRICS.counters.get('ocr_pixels', 0)
+        samples = []
+        for fields in pages:
+            page, header = prepare(render_coversheet(fields))
+            seconds, extracted = _timed(Server.extract_page_fields, page, 'crops', header)
+            samples.append(seconds)
+            expected = expected_fields(fields)
+            total += len(expected)
+            hits += sum(1 for key, value in expected.items()
+                        if str(extracted.get(key)).replace(' ', '') == value.replace(' ', ''))
+        result = summarize(samples)
+        result['hit_rate'] = round(hits / total, 4) if total else None
+        result['ocr_pixels_per_page'] = (Server.METRICS.counters.get('ocr_pixels', 0) - pixels) // page_count
+        results[name] = result
+    print(f"Preprocessing: hit rate {results['baseline']['hit_rate']} -> {results['preprocessed']['hit_rate']}, "
+          f"OCR pixels/page {results['baseline']['ocr_pixels_per_page']} -> {results['preprocessed']['ocr_pixels_per_page']}")
+    return results
+
+
+def bench_triage(page_count, seed, threshold):
+    """
+    Latency of triage_page, and how many rendered coversheets it keeps and blank pages it skips.
+    """
+    rnd = random.Random(seed)
+    pages = [(render_coversheet(synthetic_page_fields(rnd)), True) for _ in range(page_count)]
+    pages += [(Image.new('RGB', PAGE_SIZE, 'white'), False) for _ in range(page_count)]
+    samples = []
+    correct = 0
+    for img, is_coversheet in pages:
+        seconds, (kept, _page_ink, _header_ink) = _timed(Server.triage_page, img, threshold)
+        samples.append(seconds)
+        correct += kept == is_coversheet
+    result = summarize(samples)
+    result['accuracy'] = round(correct / len(pages), 4)
+    return result
+
+
+def bench_patterns(page_count, seed):
+    rnd = random.Random(seed)
+    texts = [synthetic_page_text(synthetic_page_fields(rnd)) for _ in range(page_count)]
+    samples = [_timed(Server.extract_time_chart, text)[0] for text in texts]
+    return summarize(samples)
+
+
+def bench_cleaners(row_counts, seed):
+    results = {}
+    for n_rows in row_counts:
+        frame = synthetic_frame(n_rows, seed)
+        seconds, cleaned = _timed(Server.clean_rows, frame.copy())
+        result = summarize([seconds], units=n_rows)
+        result['rows_per_sec'] = result.pop('items_per_sec')
+
+        # The vectorized time cleaner must agree with the scalar one
+        sample = frame[Server.TIME_COLUMNS[:3]].head(20000)
+        scalar = sample.apply(lambda column: column.apply(Server.clean_time_format))
+        vectorized = Server.clean_time_columns(sample.copy(), list(sample.columns))
+        result['matches_scalar'] = bool(scalar.fillna('').astype(str).equals(vectorized.fillna('').astype(str)))
+        results[str(n_rows)] = result
+    return results
+
+
+def bench_csv_sink(workdir, history_rows, batches, batch_size, seed):
+    """
+    Append batches to a CSV that already holds history_rows rows; per-flush latency
+    should not grow with the size of the history.
+    """
+    csv_path = os.path.join(workdir, 'history.csv')
+    history = synthetic_frame(history_rows, seed)
+    # One turnaround per row (distinct natural keys) so nothing is merged
+    history['Flight Arrival'] = [f"XY {i}" for i in range(history_rows)]
+    Server.clean_rows(history).to_csv(csv_path, index=False)
+    # The first open indexes the history; later opens reuse the index
+    open_seconds, sink = _timed(Server.CsvResultSink, csv_path, flush_size=batch_size)
+    sink.close()
+    reopen_seconds, sink = _timed(Server.CsvResultSink, csv_path, flush_size=batch_size)
+    rows = synthetic_frame(batches * batch_size, seed + 1)
+    rows['Flight Arrival'] = [f"SV {i}" for i in range(len(rows))]
+    records = rows.to_dict('records')
+    samples = []
+    for batch in range(batches):
+        for record in records[batch * batch_size:(batch + 1) * batch_size - 1]:
+            sink.add(record)
+        samples.append(_timed(sink.add, records[(batch + 1) * batch_size - 1])[0])
+    sink.close()
+    result = summarize(samples, units=batch_size)
+    result['rows_per_sec'] = result.pop('items_per_sec')
+    result['history_rows'] = history_rows
+    result['open_s'] = round(open_seconds, 4)
+    result['reopen_s'] = round(reopen_seconds, 4)
+    return result
+
+
+def compare(current, baseline):
+    """
+    Print the change of every mean latency and field hit rate against a saved run.
+    """
+    def walk(new, old, path):
+        for key, value in new.items():
+            if isinstance(value, dict) and isinstance(old.get(key), dict):
+                walk(value, old[key], path + [key])
+            elif key == 'mean_ms' and old.get(key):
+                ratio = value / old[key]
+                print(f"{'/'.join(path):45s} {old[key]:>10.3f} ms -> {value:>10.3f} ms  ({ratio:.2f}x)")
+            elif key == 'hit_rate' and old.get(key) is not None:
+                print(f"{'/'.join(path):45s} hit rate {old[key]:.4f} -> {value:.4f}")
+    walk(current['stages'], baseline.get('stages', {}), [])
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='coversheet_bench_')
+    try:
+        stages = {}
+        stages['save_images'], img_folder = sampled(bench_rasterize, workdir, args.pdfs, args.pages, args.seed)
+        if img_folder is None:
+            # No poppler: OCR the rendered pages straight from PNG files instead
+            img_folder = os.path.join(workdir, 'IMG')
+            os.makedirs(os.path.join(img_folder, 'synthetic'))
+            rnd = random.Random(args.seed)
+            for i in range(args.pdfs * args.pages):
+                render_coversheet(synthetic_page_fields(rnd)).save(
+                    os.path.join(img_folder, 'synthetic', f"page_{i + 1}.png"))
+        page_files = sorted(Server.iter_page_files(img_folder))
+
+        stages['extract_text_from_image'] = sampled(bench_ocr, page_files)
+        for ocr_mode in args.ocr_modes:
+            stages[f'process_page[{ocr_mode}]'] = sampled(bench_process_page, page_files, ocr_mode)
+        stages['preprocessing'] = sampled(bench_preprocessing, args.preprocess_pages, args.seed, args.binarize, args.downscale)
+        stages['triage'] = sampled(bench_triage, args.preprocess_pages, args.seed, Server.DEFAULT_TRIAGE_THRESHOLD)
+        stages['extract_time_chart'] = sampled(bench_patterns, args.pattern_pages, args.seed)
+        stages['clean_rows'] = sampled(bench_cleaners, args.rows, args.seed)
+        stages['csv_sink'] = {str(history): sampled(bench_csv_sink, workdir, history, args.batches, args.batch_size, args.seed)
+                              for history in args.history}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'tesseract': Server.tesseract_version(),
+        'peak_rss_mb': _rss(),
+        'stages': stages,
+    }
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the coversheet pipeline on synthetic data.")
+    parser.add_argument('--pdfs', type=int, default=2, help="Synthetic PDFs to rasterize.")
+    parser.add_argument('--pages', type=int, default=5, help="Pages per synthetic PDF.")
+    parser.add_argument('--ocr-modes', type=lambda v: v.split(','), default=['crops', 'layout'],
+                        help="Comma-separated OCR modes timed end to end with process_page.")
+    parser.add_argument('--preprocess-pages', type=int, default=10,
+                        help="Pages OCRed with and without preprocessing to compare field hit rates.")
+    parser.add_argument('--binarize', type=int, default=160, help="Binarization grey level of the preprocessed pages.")
+    parser.add_argument('--downscale', type=float, default=0.5, help="Downscale factor of the preprocessed pages.")
+    parser.add_argument('--pattern-pages', type=int, default=2000, help="Page texts for extract_time_chart.")
+    parser.add_argument('--rows', type=_int_list, default=[10000, 100000, 1000000], help="Cleaner frame sizes.")
+    parser.add_argument('--history', type=_int_list, default=[1000, 100000], help="Existing CSV sizes for the sink.")
+    parser.add_argument('--batches', type=int, default=20, help="Sink flushes timed per history size.")
+    parser.add_argument('--batch-size', type=int, default=Server.DEFAULT_FLUSH_SIZE, help="Rows per sink flush.")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    parser.add_argument('--compare', help="Earlier JSON results to compare against.")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
@@ -0,0 +1,108 @@
+"""
+The vectorized column cleaners must give the same result as the scalar cleaners
+they replaced, value for value.
+"""
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import Server  # noqa: E402
+
+N_ROWS = 200000
+
+# Valid, malformed and missing values, with the awkward cases OCR produces:
+# surrounding and trailing whitespace, non-ASCII digits and letters, numbers.
+TIMES = ['09:45', '9:45', '00:00', '23:59', '24:00', '12:60', '9:5', ' 09:45 ', '09:45 | ETA', '09:45|',
+         '| 09:45', '09:45 | 10:00', '09:45\n', '09:45\n| ETA', '٠٩:٤٥', '0٩:45', '１２:３０', '09.45',
+         'Not found', '', ' ', 'nan', None, np.nan, 945, 9.45, True, 1, 1.0]
+FLIGHTS = ['SV 123', 'SV123', 'sv 9', 'd3169', 'S 12', 'SV-1', ' SV 123 ', 'SV  123', 'SV\t123', 'SV 123\n',
+           'SV ١٢٣', 'ÄB12', 'XY9', '12345', 'Not found', '', None, np.nan, 123456, 123456.0]
+CODES = ['RUH', 'jed', 'RU', 'ABCD', ' RUH', 'RUH\n', 'R1H', 'ÄÖÜ', 'ß12', 'ǅab', 'Not found', '', None, np.nan, 123]
+PRNS = ['15029674', '15029674/A', ' 15029674', '1502967', '150296745', '١٥٠٢٩٦٧٤', '15029674\n',
+        'A15029674', 'Not found', '', None, np.nan, 15029674]
+DATES = ['01.02.2024', '1.2.2024', ' 5.6.2024 ', '12/31/2023', '12/31/2023\n', ' 12/31/2023', '1/31/2023',
+         '٠١.٠٢.٢٠٢٤', '12/31/٢٠٢٣', '01.02.24', '31.12.2023\n', 'Not found', '', 'garbage', None, np.nan, 1, 1.0]
+
+
+def _mixed(values, seed):
+    rng = np.random.default_rng(seed)
+    return pd.Series(rng.choice(np.array(values, dtype=object), size=N_ROWS), dtype=object)
+
+
+def _reference_clean_date_column(values, previous_date=None):
+    # The row-by-row clean_date_column the vectorized version replaced
+    def clean_date(value):
+        nonlocal previous_date
+        if re.match(r'^\d{2}/\d{2}/\d{4}$', str(value)):
+            previous_date = value
+            return value
+        if pd.isna(value) or value in ['Not found', '', None]:
+            return previous_date
+        value = str(value).strip()
+        match = re.match(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})$', value)
+        if match:
+            day, month, year = match.groups()
+            previous_date = f"{month.zfill(2)}/{day.zfill(2)}/{year}"
+            return previous_date
+        return previous_date if previous_date else np.nan
+
+    return values.apply(clean_date)
+
+
+def assert_same(vectorized, scalar):
+    """
+    Compare two cleaned columns value for value, treating all missing values as equal.
+    """
+    vectorized = [None if not isinstance(v, str) and pd.isna(v) else v for v in vectorized]
+    scalar = [None if not isinstance(v, str) and pd.isna(v) else v for v in scalar]
+    mismatches = [(i, a, b) for i, (a, b) in enumerate(zip(vectorized, scalar)) if a != b]
+    assert len(vectorized) == len(scalar)
+    assert not mismatches, f"{len(mismatches)} mismatch(es), e.g. (row, vectorized, scalar) {mismatches[:5]}"
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_clean_time_format_column(dtype):
+    values = _mixed(TIMES, 1)
+    assert_same(Server.clean_time_format_column(values.astype(dtype) if dtype == 'str' else values),
+                values.apply(Server.clean_time_format))
+
+
+def test_clean_time_columns():
+    df = pd.DataFrame({column: _mixed(TIMES, seed) for seed, column in enumerate(Server.TIME_COLUMNS[:4])})
+    scalar = df.apply(lambda column: column.apply(Server.clean_time_format))
+    vectorized = Server.clean_time_columns(df.copy(), list(df.columns))
+    for column in df.columns:
+        assert_same(vectorized[column], scalar[column])
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_clean_flight_code_column(dtype):
+    values = _mixed(FLIGHTS, 2)
+    assert_same(Server.clean_flight_code_column(values.astype(dtype) if dtype == 'str' else values),
+                values.apply(Server.clean_flight_code))
+
+
+def test_check_3_letter_code_column():
+    values = _mixed(CODES, 3)
+    assert_same(Server.check_3_letter_code_column(values), values.apply(Server.check_3_letter_code))
+
+
+def test_extract_8_digits_column():
+    values = _mixed(PRNS, 4)
+    assert_same(Server.extract_8_digits_column(values), values.apply(Server.extract_8_digits))
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+@pytest.mark.parametrize('previous_date', [None, '01/01/2020'])
+def test_clean_date_column(previous_date, dtype):
+    values = _mixed(DATES, 5)
+    if dtype == 'str':
+        values = values.astype(dtype)
+    cleaned = Server.clean_date_column(pd.DataFrame({'Date': values}), previous_date)['Date']
+    assert_same(cleaned, _reference_clean_date_column(values, previous_date))
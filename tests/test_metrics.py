@@ -0,0 +1,66 @@
+"""
+Metrics gathered in pool workers are merged into the parent's exactly once.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import Server  # noqa: E402
+
+
+def _work(_item):
+    # Pool task counting one item, drained the way _process_page_safe does
+    Server.METRICS.incr('items')
+    with Server.METRICS.timer('item'):
+        pass
+    return Server.METRICS.drain()
+
+
+def test_worker_metrics_are_not_counted_twice():
+    Server.METRICS.reset()
+    Server.METRICS.incr('parent', 10)
+    with Server.METRICS.timer('parent_stage'):
+        pass
+    with ProcessPoolExecutor(max_workers=2, initializer=Server._init_worker, initargs=Server._worker_args()) as executor:
+        for snapshot in executor.map(_work, range(20)):
+            Server.METRICS.merge(snapshot)
+    assert Server.METRICS.counters == {'parent': 10, 'items': 20}
+    assert Server.METRICS.timings['parent_stage']['count'] == 1
+    assert Server.METRICS.timings['item']['count'] == 20
+    Server.METRICS.reset()
+
+
+def test_pipeline_report_counts_every_page_once(tmp_path, monkeypatch):
+    pdf_folder = tmp_path / 'PDF'
+    pdf_folder.mkdir()
+    for n in range(6):
+        (pdf_folder / f"p{n}.pdf").write_bytes(b'')
+
+    def rasterize_pdf(pdf_path, output_folder='IMG', manifest=None, on_page=None, **_options):
+        # Keeps METRICS' lock busy while the OCR workers are being started
+        folder = os.path.join(output_folder, os.path.splitext(os.path.basename(pdf_path))[0])
+        os.makedirs(folder, exist_ok=True)
+        for k in range(5):
+            for _ in range(200):
+                Server.METRICS.incr('lock_traffic')
+            page = os.path.join(folder, f"page_{k}.png")
+            open(page, 'wb').close()
+            Server.METRICS.incr('pages_rasterized')
+            on_page(page)
+        return {}
+
+    def process_page(file_path, ocr_mode='crops'):
+        name = os.path.basename(os.path.dirname(file_path)) + os.path.basename(file_path)
+        return {'Date': '01.02.2024', 'Flight Arrival': f"SV{abs(hash(name)) % 10 ** 6}", 'From': 'RUH'}
+
+    monkeypatch.setattr(Server, 'rasterize_pdf', rasterize_pdf)
+    monkeypatch.setattr(Server, 'process_page', process_page)
+    Server.METRICS.reset()
+    Server.pipeline(str(pdf_folder), str(tmp_path / 'IMG'), output_csv=str(tmp_path / 'out.csv'),
+                    ocr_workers=2, raster_workers=3)
+    assert Server.METRICS.counters['pages_rasterized'] == 30
+    assert Server.METRICS.timings['page']['count'] == 30
+    assert Server.METRICS.timings['index_rebuild']['count'] == 1
+    Server.METRICS.reset()
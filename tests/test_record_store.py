@@ -0,0 +1,169 @@
+"""
+Duplicate detection and merging in CsvResultSink / RecordStore, and keeping the
+CSV, its index and the Parquet copy consistent across crashes and outside edits.
+"""
+import csv
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import Server  # noqa: E402
+
+
+def row(flight='SV123', sta='', date='01.02.2024', station='RUH', **fields):
+    return dict({'Date': date, 'Station': station, 'Flight Arrival': flight, 'Flight Departure': 'SV124',
+                 'From': 'RUH', 'To': 'JED', 'STA': sta}, **fields)
+
+
+def read_csv(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def write(csv_path, *rows, **options):
+    with Server.CsvResultSink(csv_path, **options) as sink:
+        for values in rows:
+            sink.add(values)
+    return sink
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    Server.METRICS.reset()
+    yield str(tmp_path / 'out.csv')
+    Server.METRICS.reset()
+
+
+def test_new_rows_are_appended(csv_path):
+    write(csv_path, row('SV1'), row('SV2'))
+    write(csv_path, row('SV3'))
+    assert list(read_csv(csv_path)['Flight Arrival']) == ['SV 1', 'SV 2', 'SV 3']
+    assert Server.METRICS.counters['appended_rows'] == 3
+
+
+def test_duplicates_are_dropped(csv_path):
+    write(csv_path, row(), row())
+    write(csv_path, row(), row(sta='Not found'))
+    assert len(read_csv(csv_path)) == 1
+    assert Server.METRICS.counters['duplicate_rows'] == 3
+
+
+def test_rows_without_a_flight_are_only_dropped_when_identical(csv_path):
+    no_flight = {'flight': None, 'Flight Departure': None}
+    write(csv_path, row(sta='10:00', **no_flight), row(sta='10:00', **no_flight), row(sta='11:00', **no_flight))
+    assert list(read_csv(csv_path)['STA']) == ['10:00', '11:00']
+
+
+def test_rows_of_a_known_turnaround_are_merged_in_place(csv_path):
+    write(csv_path, row('SV1'), row('SV2', sta='09:00'))
+    write(csv_path, row('SV1', sta='10:00'), row('SV2', sta='09:30'), row('SV3'))
+    final = read_csv(csv_path)
+    # Newer non-empty values win; records keep their place in the file
+    assert list(final['Flight Arrival']) == ['SV 1', 'SV 2', 'SV 3']
+    assert list(final['STA']) == ['10:00', '09:30', '']
+    assert Server.METRICS.counters['merged_rows'] == 2
+
+
+def test_other_stations_and_dates_are_other_turnarounds(csv_path):
+    write(csv_path, row(), row(station='JED'), row(date='02.02.2024'))
+    assert len(read_csv(csv_path)) == 3
+
+
+def test_merge_survives_a_crash_before_close(csv_path):
+    write(csv_path, row())
+    sink = Server.CsvResultSink(csv_path)
+    sink.add(row(sta='10:00'))
+    sink.flush()
+    assert sink.store.dirty
+    # Crash: the merge is committed in the index but the CSV was never rewritten
+    sink.store.conn.close()
+    assert read_csv(csv_path)['STA'][0] == ''
+
+    reopened = Server.CsvResultSink(csv_path)
+    assert not reopened.store.dirty
+    reopened.close()
+    assert list(read_csv(csv_path)['STA']) == ['10:00']
+
+
+def test_sync_writes_merges_without_closing(csv_path):
+    write(csv_path, row())
+    with Server.CsvResultSink(csv_path) as sink:
+        sink.add(row(sta='10:00'))
+        sink.flush()
+        assert sink.sync()
+        assert list(read_csv(csv_path)['STA']) == ['10:00']
+        assert not sink.sync()
+
+
+def test_index_is_rebuilt_when_the_csv_changes(csv_path):
+    write(csv_path, row('SV1'))
+    assert Server.METRICS.timings['index_rebuild']['count'] == 1
+    write(csv_path, row('SV2'))
+    assert Server.METRICS.timings['index_rebuild']['count'] == 1
+
+    # Rows added by another program are indexed on the next open
+    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+        values = dict(read_csv(csv_path).iloc[0])
+        values.update({'Flight Arrival': 'SV 9', 'STA': '12:00'})
+        csv.writer(f).writerow(list(values.values()))
+    write(csv_path, row('SV9', sta='12:00'), row('SV9', sta='12:30'))
+    assert Server.METRICS.timings['index_rebuild']['count'] == 2
+    final = read_csv(csv_path)
+    assert list(final['Flight Arrival']) == ['SV 1', 'SV 2', 'SV 9']
+    assert final['STA'].iloc[-1] == '12:30'
+
+
+def test_duplicates_already_in_the_csv_are_merged_on_rebuild(csv_path):
+    write(csv_path, row('SV1'), row('SV2'))
+    with open(csv_path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines + [lines[1].replace(',RUH,JED,,', ',RUH,JED,,,,,10:00', 1)]) + "\n")
+    os.remove(csv_path + '.index.sqlite')
+    write(csv_path)
+    final = read_csv(csv_path)
+    assert list(final['Flight Arrival']) == ['SV 1', 'SV 2']
+
+
+def test_failed_append_keeps_csv_and_index_consistent(csv_path, monkeypatch):
+    write(csv_path, row('SV1'))
+    size = os.path.getsize(csv_path)
+    sink = Server.CsvResultSink(csv_path)
+    sink.add(row('SV2'))
+
+    def locked(_fd):
+        raise PermissionError("CSV locked")
+
+    monkeypatch.setattr(os, 'fsync', locked)
+    with pytest.raises(PermissionError):
+        sink.flush()
+    monkeypatch.undo()
+    assert os.path.getsize(csv_path) == size
+
+    # The failed rows are not remembered as written
+    sink.add(row('SV2'))
+    sink.close()
+    assert list(read_csv(csv_path)['Flight Arrival']) == ['SV 1', 'SV 2']
+
+
+def test_parquet_gets_merged_versions_and_compacts_to_the_latest(csv_path, tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    dataset = Server.ParquetDataset(str(tmp_path / 'parquet'))
+    write(csv_path, row('SV1'), row('SV2'), writers=[dataset])
+    write(csv_path, row('SV1', sta='10:00'), row('SV1', sta='10:00'), writers=[dataset])
+    write(csv_path, row('SV1', STD='11:00'), writers=[dataset])
+
+    versions = pq.read_table(dataset.root).to_pandas()
+    assert sorted(versions['Flight Arrival']) == ['SV 1', 'SV 1', 'SV 1', 'SV 2']
+
+    assert dataset.compact() == 1
+    table = pq.read_table(dataset.root).to_pandas().sort_values('Flight Arrival')
+    assert list(table['Flight Arrival']) == ['SV 1', 'SV 2']
+    latest = table.iloc[0]
+    assert (str(latest['STA']), str(latest['STD'])) == ('10:00:00', '11:00:00')
+    assert len(read_csv(csv_path)) == 2
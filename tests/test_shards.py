@@ -0,0 +1,181 @@
+"""
+Lease claiming and the sharded batch mode, with several worker processes on one box.
+"""
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import Server  # noqa: E402
+
+N_WORKERS = 8
+N_ITEMS = 300
+TIMEOUT = 1.0
+
+
+def _claim_all(folder, owner, names, barrier, results):
+    # Worker process: try to claim every item once, in an order of its own
+    leases = Server.LeaseDirectory(folder, owner, TIMEOUT)
+    names = list(names)
+    rng = random.Random(owner)
+    rng.shuffle(names)
+
+    def slow_open(path, *args, **kwargs):
+        # Widen the window in which another worker can replace a lease before it is read
+        if str(path).endswith('.lease'):
+            time.sleep(rng.random() / 500)
+        return open(path, *args, **kwargs)
+
+    Server.open = slow_open
+    barrier.wait()
+    results.put((owner, [name for name in names if leases.claim(name)]))
+
+
+def _claim_round(folder, names, round_number):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(N_WORKERS)
+    results = context.Queue()
+    processes = [context.Process(target=_claim_all, args=(folder, f"worker-{round_number}-{i}", names, barrier, results))
+                 for i in range(N_WORKERS)]
+    for process in processes:
+        process.start()
+    claims = Counter()
+    for _ in processes:
+        _owner, claimed = results.get(timeout=120)
+        claims.update(claimed)
+    for process in processes:
+        process.join()
+    return claims
+
+
+def test_concurrent_claims_and_reclaims_never_share_an_item(tmp_path):
+    folder = str(tmp_path / 'leases')
+    names = [f"{i}.pdf" for i in range(N_ITEMS)]
+
+    claims = _claim_round(folder, names, 1)
+    assert set(claims) == set(names)
+    assert max(claims.values()) == 1
+
+    # Every lease is now stale: each further round reclaims them all concurrently
+    for round_number in range(2, 5):
+        time.sleep(TIMEOUT + 0.5)
+        claims = _claim_round(folder, names, round_number)
+        doubles = {name: count for name, count in claims.items() if count > 1}
+        assert not doubles, f"claimed by several workers in round {round_number}: {doubles}"
+        assert claims
+
+
+def test_fresh_lease_is_not_reclaimed(tmp_path):
+    a = Server.LeaseDirectory(str(tmp_path), 'a', timeout=60)
+    b = Server.LeaseDirectory(str(tmp_path), 'b', timeout=60)
+    assert a.claim('x.pdf')
+    assert not b.claim('x.pdf')
+    assert a.holds('x.pdf') and a.renew('x.pdf')
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_stale_lease_is_reclaimed(tmp_path):
+    a = Server.LeaseDirectory(str(tmp_path), 'a', timeout=1)
+    b = Server.LeaseDirectory(str(tmp_path), 'b', timeout=1)
+    assert a.claim('x.pdf')
+    _age(a._path('x.pdf'), 10)
+    assert b.claim('x.pdf')
+    assert b.holds('x.pdf')
+    assert not a.holds('x.pdf') and not a.renew('x.pdf')
+    # Releasing a lost lease leaves the new owner's alone
+    a.release('x.pdf')
+    assert b.holds('x.pdf')
+
+
+def test_abandoned_reclaim_marker_is_removed(tmp_path):
+    a = Server.LeaseDirectory(str(tmp_path), 'a', timeout=1)
+    b = Server.LeaseDirectory(str(tmp_path), 'b', timeout=1)
+    assert a.claim('x.pdf')
+    lease = a._path('x.pdf')
+    marker = f"{lease}.{a.tokens['x.pdf']}.reclaim"
+    open(marker, 'w').close()
+    _age(lease, 10)
+
+    # A worker is still reclaiming: back off
+    assert not b.claim('x.pdf')
+    # That worker died holding the marker
+    _age(marker, 10)
+    assert b.claim('x.pdf')
+    assert b.holds('x.pdf')
+    assert not os.path.exists(marker)
+
+
+@pytest.fixture
+def shard_root(tmp_path, monkeypatch):
+    """
+    Shared folder with three PDFs, and stubs for the rasterizer and page reader:
+    page k of pN.pdf holds flight SV N0k. Both pages of p3.pdf repeat p1.pdf's
+    turnaround with more fields, so merging folds them into p1's records.
+    """
+    root = tmp_path / 'root'
+    folders = Server.shard_folders(str(root))
+    os.makedirs(folders['pdf'])
+    for n in (1, 2, 3):
+        open(os.path.join(folders['pdf'], f"p{n}.pdf"), 'wb').close()
+
+    def rasterize_pdf(pdf_path, output_folder='IMG', **_options):
+        pdf_folder = os.path.join(output_folder, os.path.splitext(os.path.basename(pdf_path))[0])
+        os.makedirs(pdf_folder, exist_ok=True)
+        for k in range(2):
+            open(os.path.join(pdf_folder, f"page_{k}.png"), 'wb').close()
+        return {}
+
+    def process_page(file_path, ocr_mode='crops'):
+        pdf = os.path.basename(os.path.dirname(file_path))
+        page = os.path.splitext(os.path.basename(file_path))[0].split('_')[1]
+        data = {'Date': '01.02.2024', 'Flight Arrival': f"SV{pdf[1] if pdf != 'p3' else '1'}0{page}", 'From': 'RUH'}
+        if pdf == 'p3':
+            data['STA'] = '10:00'
+        return data
+
+    monkeypatch.setattr(Server, 'rasterize_pdf', rasterize_pdf)
+    monkeypatch.setattr(Server, 'process_page', process_page)
+    # The shard indexes live in the local temp directory
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    Server.METRICS.reset()
+    return str(root)
+
+
+def test_run_shards(shard_root, tmp_path):
+    output_csv = str(tmp_path / 'final.csv')
+    report = str(tmp_path / 'report.json')
+    Server.run_shards(shard_root, workers=2, lease_timeout=30, output_csv=output_csv, report_path=report)
+
+    folders = Server.shard_folders(shard_root)
+    assert sorted(os.listdir(folders['done'])) == ['p1.pdf.json', 'p2.pdf.json', 'p3.pdf.json']
+    assert not os.listdir(folders['leases'])
+    final = pd.read_csv(output_csv, dtype=str, keep_default_na=False)
+    assert sorted(final['Flight Arrival']) == ['SV 100', 'SV 101', 'SV 200', 'SV 201']
+    assert set(final[final['Flight Arrival'].str.startswith('SV 1')]['STA']) == {'10:00'}
+    assert set(final['Date']) == {'02/01/2024'}
+
+    # The report covers the work done in the worker processes
+    with open(report, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['counters']['shard_pdfs'] == 3
+    assert report['stages']['page']['count'] == 6
+
+    # Merging again changes nothing
+    with open(output_csv, encoding='utf-8') as f:
+        before = f.read()
+    assert Server.merge_shards(shard_root, output_csv) == 0
+    with open(output_csv, encoding='utf-8') as f:
+        assert f.read() == before
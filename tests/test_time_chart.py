@@ -0,0 +1,117 @@
+"""
+extract_time_chart must give the same result as the per-field regex dict it replaced.
+"""
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import Server  # noqa: E402
+
+N_TEXTS = 30000
+
+# The pattern dict extract_page_fields used before the single-scan extract_time_chart,
+# kept verbatim (duplicate key included: the later pattern wins, at the first key's place)
+BASELINE_PATTERNS = {  # noqa: F601
+    "Date": r"Date:\s*(\d{2}\.\d{2}\.\d{4})",
+    "STA": r"STA:\s*(\d{2}:\d{2})",
+    "ETA": r"ETA:\s*(\d{2}:\d{2})",
+    "ATA": r"ATA:\s*(\d{2}:\d{2})",
+    "STD": r"STD:\s*(\d{2}:\d{2})",
+    "ETD": r"ETD:\s*(\d{2}:\d{2})?",
+    "ATD": r"ATD:\s*(\d{2}:\d{2})?",
+    "Blocks In": r"Blocks In\s*(\d{2}:\d{2})",
+    "Position PLB/Step": r"Position PLB/Step\s*(\d{2}:\d{2})",
+    "Open Door": r"Open Door\s*(\d{2}:\d{2})",
+    "Passenger Deplane Start": r"Passenger Deplane\s*(\d{2}:\d{2})",
+    "Passenger Deplane Finish": r"Passenger Deplane\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Cabin Cleaning Start": r"Cabin Cleaning\s*(\d{2}:\d{2})",
+    "Cabin Cleaning Finish": r"Cabin Cleaning\s*\d{2}:\d{2}.*\s*(\d{2}:\d{2})",
+    "Customs Clearance Start": r"Customs Clearance\s*(\d{2}:\d{2})",
+    "Customs Clearance Finish": r"Customs Clearance\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Cabin Cleaning start": r"Cabin Cleaning\s*(\d{2}:\d{2})",
+    "Cabin Cleaning Finish": r"Cabin Cleaning\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Galley Services Start": r"Galley Services\s*(\d{2}:\d{2})",
+    "Galley Services Finish": r"Galley Services\s*\d{2}:\d{2}.*\s*(\d{2}:\d{2})",
+    "Cabin Security Check Start": r"Cabin Security Check\s*(\d{2}:\d{2})",
+    "Cabin Security Check Finish": r"Cabin Security Check\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Boarding Clearance": r"Boarding Clearance\s*(\d{2}:\d{2})",
+    "Passengers Enplane Start": r"Passengers Enplane\s*(\d{2}:\d{2})",
+    "Passengers Enplane Finish": r"Passengers Enplane\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "TOP Finalization Start": r"TOP Finalization\s*(\d{2}:\d{2})",
+    "TOP Finalization Finish": r"TOP Finalization\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "FWD Unloading Start": r"FWD Unloading\s*(\d{2}:\d{2})",
+    "FWD Unloading Finish": r"FWD Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "FWD Leading Start": r"FWD Loading\s*(\d{2}:\d{2})",
+    "FWD Leading Finish": r"FWD Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "AFT Unloading Start": r"AFT Unloading\s*(\d{2}:\d{2})",
+    "AFT Unloading Finish": r"AFT Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "AFT Loading Start": r"AFT Loading\s*(\d{2}:\d{2})",
+    "AFT Loading Finish": r"AFT Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Bulk Unloading Start": r"Bulk Unloading\s*(\d{2}:\d{2})",
+    "Bulk Unloading Finish": r"Bulk Unloading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Bulk Loading Start": r"Bulk Loading\s*(\d{2}:\d{2})",
+    "Bulk Loading Finish": r"Bulk Loading\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "GPU/ACU Support Start": r"GPU/ACU Support\s*(\d{2}:\d{2})",
+    "GPU/ACU Support Finish": r"GPU/ACU Support\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Refueling Start": r"Refueling\s*(\d{2}:\d{2})",
+    "Refueling Finish": r"Refueling\s*\d{2}:\d{2}\s*(\d{2}:\d{2})",
+    "Remove PLB/Step": r"Remove PLB/Step\s*(\d{2}:\d{2})",
+    "Close Door": r"Close Door\s*(\d{2}:\d{2})",
+    "Pushback/Block-out": r"Pushback/Block-out\s*(\d{2}:\d{2})",
+}
+
+
+def baseline_time_chart(formatted_text):
+    # One re.search per field, as extract_data_using_patterns did
+    extracted_data = {}
+    for key, pattern in BASELINE_PATTERNS.items():
+        match = re.search(pattern, formatted_text)
+        extracted_data[key] = match.group(1) if match else "Not found"
+    return extracted_data
+
+
+LABELS = [label for label, *_ in Server.TIME_CHART_LABELS]
+# Text OCR puts around and between the labels: near misses, prefixes of other labels, bad times
+NOISE = ['STA', 'ETD', 'Cabin', 'Loading', 'FWD', 'Passenger', 'Deplane', 'Finish', 'Start', 'Date:', 'Date',
+         'TC/TOC:', 'SV 123', '15029674/A', '-', '|', ':', '1:00', '99:99', '12:3', '123:45', '01.02.2024', 'x']
+SEPARATORS = [' ', ' ', '  ', '\n', '\t', '', ' \n ']
+
+
+def random_text(rng):
+    tokens = []
+    for _ in range(rng.randint(0, 40)):
+        roll = rng.random()
+        if roll < 0.35:
+            tokens.append(rng.choice(LABELS))
+        elif roll < 0.75:
+            tokens.append(f"{rng.randint(0, 29):02d}:{rng.randint(0, 69):02d}")
+        elif roll < 0.8:
+            tokens.append(f"Date:{rng.choice(SEPARATORS)}{rng.randint(1, 31):02d}.{rng.randint(1, 12):02d}.2024")
+        else:
+            tokens.append(rng.choice(NOISE))
+    return "".join(token + rng.choice(SEPARATORS) for token in tokens)
+
+
+def test_extract_time_chart_matches_the_per_field_patterns():
+    rng = random.Random(20240201)
+    for _ in range(N_TEXTS):
+        text = random_text(rng)
+        result = Server.extract_time_chart(text)
+        expected = baseline_time_chart(text)
+        assert result == expected, f"text {text!r}"
+
+
+def test_extract_time_chart_on_a_coversheet():
+    text = ("Date: 01.02.2024\nSTA: 09:45 ETA: 09:50 ATA: 09:55\nSTD: 11:00 ETD: ATD: 11:20\n"
+            "Blocks In 09:56\nPassenger Deplane 10:00 10:15\nCabin Cleaning 10:05 10:25\n"
+            "Galley Services 10:10 late 10:20 10:30\nFWD Loading 10:30 10:45\nPushback/Block-out 11:21\n")
+    assert Server.extract_time_chart(text) == baseline_time_chart(text)
+    result = Server.extract_time_chart(text)
+    assert result['Date'] == '01.02.2024'
+    assert result['ETD'] is None
+    assert result['Galley Services Finish'] == '10:30'
+    assert (result['FWD Leading Start'], result['FWD Leading Finish']) == ('10:30', '10:45')
+    assert result['Open Door'] == 'Not found'